@@ -0,0 +1,213 @@
+'''benchmarks the client against an in-process `MockKaspad`, writes the results as JSON, and compares them to a baseline
+
+    python benchmarks/bench_client.py --output results.json
+    python benchmarks/bench_client.py --baseline results.json --tolerance 0.15 # exits with 1 on a regression
+'''
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Union
+
+import grpc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # runs from a checkout without installing
+
+from kaspy import __version__
+from kaspy.kaspa_clients import RPCClient
+from kaspy.testing import MockKaspad
+
+HIGHER, LOWER = 'higher', 'lower' # which way is better
+
+SERIALIZED_REQUESTS = {
+    'getInfoRequest': None,
+    'getBlockRequest': {'hash': '%064x' % 1, 'includeTransactions': True},
+    'getBlocksRequest': {'lowHash': '%064x' % 1, 'includeBlocks': True, 'includeTransactions': True},
+    'getUtxosByAddressesRequest': {'addresses': [f'kaspa:address{index}' for index in range(100)]},
+}
+
+
+def percentile(samples: List[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def timed_calls(call: Callable[[], None], count: int) -> List[float]:
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+class Benchmarks:
+    '''each `bench_*` method adds its results, as `name -> {value, unit, better}`'''
+
+    def __init__(self, requests: int = 2000, concurrency: int = 16, notifications: int = 20000, serializations: int = 2000,
+                 connections: int = 20) -> None:
+        self.requests = requests
+        self.concurrency = concurrency
+        self.notifications = notifications
+        self.serializations = serializations
+        self.connections = connections
+        self.results = {}
+
+    def add(self, name: str, value: float, unit: str, better: str):
+        self.results[name] = {'value': value, 'unit': unit, 'better': better}
+
+    def add_latencies(self, name: str, latencies: List[float], elapsed: float):
+        self.add(f'{name}.requests_per_sec', len(latencies) / elapsed, 'req/s', HIGHER)
+        self.add(f'{name}.p50_ms', percentile(latencies, 50) * 1000, 'ms', LOWER)
+        self.add(f'{name}.p99_ms', percentile(latencies, 99) * 1000, 'ms', LOWER)
+
+    def run(self) -> Dict[str, dict]:
+        with MockKaspad(workers=self.concurrency + 4, notification_rate=None) as kaspad:
+            for bench in (self.bench_serial, self.bench_concurrent, self.bench_notifications, self.bench_serialization, self.bench_memory):
+                bench(kaspad)
+        return self.results
+
+    def _client(self, kaspad: MockKaspad) -> RPCClient:
+        client = RPCClient()
+        client.connect('127.0.0.1', kaspad.port)
+        client.request('getInfoRequest') # warms the stream up
+        return client
+
+    def bench_serial(self, kaspad: MockKaspad):
+        client = self._client(kaspad)
+        for raw in (False, True):
+            start = time.perf_counter()
+            latencies = timed_calls(lambda: client.request('getInfoRequest', raw=raw), self.requests)
+            self.add_latencies(f'request.serial{".raw" if raw else ""}', latencies, time.perf_counter() - start)
+        client.close()
+
+    def bench_concurrent(self, kaspad: MockKaspad):
+        client = self._client(kaspad)
+        per_thread = max(1, self.requests // self.concurrency)
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            start = time.perf_counter()
+            runs = [pool.submit(timed_calls, lambda: client.request('getInfoRequest'), per_thread) for _ in range(self.concurrency)]
+            latencies = [latency for run in runs for latency in run.result()]
+            elapsed = time.perf_counter() - start
+        self.add_latencies(f'request.concurrent_{self.concurrency}', latencies, elapsed)
+        client.close()
+
+    def bench_notifications(self, kaspad: MockKaspad):
+        kaspad.notification_count = self.notifications
+        for raw in (False, True):
+            client = self._client(kaspad)
+            received = [0]
+            done = threading.Event()
+
+            def callback(notification):
+                received[0] += 1
+                if received[0] == self.notifications:
+                    done.set()
+
+            start = time.perf_counter()
+            client.subscribe('notifyVirtualDaaScoreChangedRequest', callback, raw=raw)
+            done.wait(120)
+            elapsed = time.perf_counter() - start
+            self.add(f'subscribe.notifications_per_sec{".raw" if raw else ""}', received[0] / elapsed, 'notifications/s', HIGHER)
+            client.close()
+        kaspad.notification_count = None
+
+    def bench_serialization(self, kaspad: MockKaspad):
+        client = self._client(kaspad)
+        stream = client.request_stream
+        for command, payload in SERIALIZED_REQUESTS.items():
+            start = time.perf_counter()
+            for _ in range(self.serializations):
+                stream._serialize_request(command, payload)
+            self.add(f'serialize_request.{command}_us', (time.perf_counter() - start) / self.serializations * 1e6, 'us', LOWER)
+            response = client.request(command, payload, raw=True)
+            start = time.perf_counter()
+            for _ in range(self.serializations):
+                stream._serialize_response_to_dict(response)
+            name = response.WhichOneof('payload')
+            self.add(f'serialize_response_to_dict.{name}_us', (time.perf_counter() - start) / self.serializations * 1e6, 'us', LOWER)
+            self.add(f'response_size.{name}_bytes', response.ByteSize(), 'bytes', LOWER)
+        client.close()
+
+    def bench_memory(self, kaspad: MockKaspad):
+        '''python allocations are traced, the resident set also covers the channels' native buffers (linux only)'''
+        gc.collect()
+        rss_before = _rss()
+        tracemalloc.start()
+        traced_before = tracemalloc.get_traced_memory()[0]
+        clients = [self._client(kaspad) for _ in range(self.connections)]
+        gc.collect()
+        traced = tracemalloc.get_traced_memory()[0] - traced_before
+        rss_after = _rss()
+        tracemalloc.stop()
+        self.add('connection.python_bytes', traced / self.connections, 'bytes', LOWER)
+        if rss_before is not None and rss_after is not None:
+            self.add('connection.rss_bytes', (rss_after - rss_before) / self.connections, 'bytes', LOWER)
+        for client in clients:
+            client.close()
+
+
+def _rss() -> Union[int, None]:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    '''returns a line per metric worse than the baseline by more than `tolerance` (a fraction)'''
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or not base['value']:
+            continue
+        change = (result['value'] - base['value']) / base['value']
+        worse = -change if result['better'] == HIGHER else change
+        if worse > tolerance:
+            regressions.append(f'{name}: {base["value"]:.4g} -> {result["value"]:.4g} {result["unit"]} ({worse:+.1%} worse)')
+    return regressions
+
+
+def main(argv: Union[List[str], None] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='path to write the results to, as JSON')
+    parser.add_argument('--baseline', help='path of earlier results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='fraction a metric may be worse than the baseline')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--notifications', type=int, default=20000)
+    parser.add_argument('--serializations', type=int, default=2000)
+    parser.add_argument('--connections', type=int, default=20)
+    args = parser.parse_args(argv)
+    logging.disable(logging.INFO) # the client logs every request
+
+    results = Benchmarks(args.requests, args.concurrency, args.notifications, args.serializations, args.connections).run()
+    report = {
+        'meta': {'kaspy': __version__, 'grpc': grpc.__version__, 'python': platform.python_version(),
+                 'platform': platform.platform(), 'time': time.time(), 'args': vars(args)},
+        'results': results,
+    }
+    for name, result in results.items():
+        print(f'{name:<60} {result["value"]:>14.4g} {result["unit"]}')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
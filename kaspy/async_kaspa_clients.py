@@ -0,0 +1,161 @@
+import asyncio
+import grpc
+from logging import getLogger
+from typing import AsyncIterator, Union
+
+from kaspy.async_streams import AsyncRequestStream
+from kaspy.kaspa_clients import _KaspaClient
+from kaspy.network.node import Node, node_acquirer
+from kaspy.protos.messages_pb2 import KaspadMessage
+from kaspy.protos.messages_pb2_grpc import RPCStub
+from kaspy.utils.commands import COMMANDS
+from kaspy.defines import MAINNET, RPC_DEF_PORTS, CONNECTED, CLOSED, DISCONNECTED
+from kaspy.log_handler.log_messages import client as cli_lm
+from kaspy.utils.version_comparer import version as ver
+from kaspy.excepts.exceptions import CLientClosed, ClientDisconnected, CommandIsNotSubcribable, NoNodeAvailable, RPCResponseException, RPCServiceUnavailable
+
+
+LOG = getLogger('[KASPA_CLI]')
+
+
+class AsyncRPCClient(_KaspaClient):
+
+    def __init__(self) -> None:
+        '''asyncio kaspa client for RPC services, built on `grpc.aio`'''
+        self.node = Node
+        self.request_stream = AsyncRequestStream
+        self.client_status = str
+        self.raw = False # if True, responses and notifications are returned as `KaspadMessage` instead of dicts
+
+    @property
+    def host(self):
+        return self.node.__str__()
+
+    # connecting opperations
+
+    async def connect(self, host: str, port: Union[int, str], idle_timeout: Union[float, int, None] = None,
+                      max_receive_size = (1024**2)*4) -> None:
+        self.client_status = CONNECTED
+        self.node = Node(host, port)
+        LOG.info(cli_lm.CONN_ESTABLISHING(self.node))
+        self.request_stream = AsyncRequestStream(self.node, RPCStub, idle_timeout=idle_timeout, max_receive_size=max_receive_size)
+        await self.request_stream.start()
+        LOG.info(cli_lm.CONN_ESTABLISHED(self.node))
+
+    async def auto_connect(self, min_kaspad_version: Union[ver, str, None] = None, subnetwork: Union[str, None] = MAINNET,
+                           conn_timeout: Union[float, None] = 3, idle_timeout: float = None, utxoindex: bool = False,
+                           max_receive_size=(1024**2)*4) -> None:
+        '''auto connect to a RPC node, node discovery runs in the default executor.
+        
+        candidates failing a check, or not answering, are skipped, raises `NoNodeAvailable` once a full scan of the dns seeds 
+        found no node to pass them'''
+        if isinstance(min_kaspad_version, str):
+            min_kaspad_version = ver.parse_from_string(min_kaspad_version)
+        port = RPC_DEF_PORTS[subnetwork]
+        nodes = node_acquirer.yield_open_nodes(port = port, passes = 1)
+        loop = asyncio.get_running_loop()
+        while True:
+            node = await loop.run_in_executor(None, next, nodes, None)
+            if node is None:
+                raise NoNodeAvailable(subnetwork)
+            await self.connect(node.ip, port, idle_timeout, max_receive_size=max_receive_size)
+            try:
+                info = (await self.request('getInfoRequest', timeout=conn_timeout, raw=False))['getInfoResponse']
+                if utxoindex and not info.get('isUtxoIndexed', False):
+                    raise LookupError
+                self.node.version = ver.parse_from_string(info['serverVersion'])
+                if min_kaspad_version and self.node.version < min_kaspad_version:
+                    raise LookupError
+                if subnetwork:
+                    network = await self.request('getCurrentNetworkRequest', timeout=conn_timeout, raw=False)
+                    self.node.network = network['getCurrentNetworkResponse']['currentNetwork'].lower()
+                    if self.node.network != subnetwork:
+                        raise LookupError
+            except (LookupError, TimeoutError, RPCServiceUnavailable, RPCResponseException, grpc.RpcError) as e:
+                LOG.debug(e)
+                await self.close()
+                continue
+            break
+
+    # disconnecting /closing opperations
+
+    async def close(self) -> None:
+        self.client_status = CLOSED
+        await self.request_stream.close()
+
+    # checks
+
+    def _verify_connection(self, command : Union[str, None]) -> Union[bool, Exception]:
+        if self.client_status == CONNECTED:
+            return True
+        elif self.client_status == DISCONNECTED:
+            raise ClientDisconnected(self.node, command)
+        elif self.client_status == CLOSED:
+            raise CLientClosed(self.node, command)
+
+    # helpers
+
+    def _use_raw(self, raw: Union[bool, None]) -> bool:
+        return self.raw if raw is None else raw
+
+    @staticmethod
+    def unwrap_response(response: KaspadMessage):
+        '''returns the oneof payload message of a raw `KaspadMessage` i.e. the `GetInfoResponseMessage` of a `getInfoResponse`'''
+        return getattr(response, response.WhichOneof('payload'))
+
+    # standard interactions
+
+    async def request(self, command : str, payload: Union[dict, str, None] = None, timeout: Union[float, int, None] = None,
+                      raw: Union[bool, None] = None) -> Union[dict, KaspadMessage]:
+        '''sends a request and awaits its response, any number of requests may be awaited concurrently'''
+        self._verify_connection(command)
+        LOG.debug(cli_lm.MSG_SENDING(command, self.node))
+        try:
+            future = await self.request_stream.submit(command, payload) # writing fails too, once the stream has ended
+            resp = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.UNAVAILABLE:
+                raise RPCServiceUnavailable(self.node, e.code().name, e.details())
+            raise RPCResponseException(self.node, e.code().name, e.details())
+        return self.request_stream._serialize_output(resp, self._use_raw(raw))
+
+    async def subscribe(self, command: str, payload: Union[dict, str, None] = None, raw: Union[bool, None] = None,
+                        maxsize: int = 0) -> AsyncIterator[Union[dict, KaspadMessage]]:
+        '''`async for` over the notifications of `command`, the subscription lasts as long as the iteration
+        
+        wrap in `contextlib.aclosing` to detach right away when breaking out of the loop'''
+        if not command.startswith('notify'):
+            raise CommandIsNotSubcribable(self.node, command)
+        raw = self._use_raw(raw)
+        notifications = asyncio.Queue(maxsize)
+        self.request_stream.attach(command, notifications)
+        try:
+            resp = self.unwrap_response(await self.request(command, payload, raw=True))
+            if resp.error.message:
+                raise RPCResponseException(self.node, command, resp.error.message)
+            while True:
+                yield self.request_stream._serialize_output(await notifications.get(), raw)
+        finally:
+            self.request_stream.detach(command, notifications)
+
+    async def stream(self, command: str, payload: Union[dict, str, None] = None, raw: Union[bool, None] = None) -> AsyncIterator[Union[dict, KaspadMessage]]:
+        '''`async for` over the notifications of `command` on their own message stream of the client's channel.
+        
+        notifications are only read as they are consumed, so gRPC flow control holds back the node when the consumer is behind'''
+        if not command.startswith('notify'):
+            raise CommandIsNotSubcribable(self.node, command)
+        raw = self._use_raw(raw)
+        notifications, response = COMMANDS[command].notifications, COMMANDS[command].response
+        call = self.request_stream._message_stream(timeout=None)
+        try:
+            await call.write(self.request_stream._serialize_request(command, payload))
+            async for output in call:
+                name = output.WhichOneof('payload')
+                if name in notifications:
+                    yield self.request_stream._serialize_output(output, raw)
+                elif name == response and getattr(output, name).error.message:
+                    raise RPCResponseException(self.node, command, getattr(output, name).error.message)
+        finally:
+            call.cancel()
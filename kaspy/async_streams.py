@@ -0,0 +1,126 @@
+from kaspy.protos.messages_pb2_grpc import RPCStub, P2PStub
+from kaspy.protos.messages_pb2 import KaspadMessage
+from kaspy.network.node import Node
+from kaspy.defines import CONNECTED, CLOSED
+from kaspy.streams import MESSAGE_STREAM_METHODS
+from kaspy.utils.commands import COMMANDS, serialize_request
+
+import asyncio
+import grpc
+import grpc.aio
+from collections import defaultdict, deque
+from google.protobuf import json_format
+from logging import getLogger
+from typing import Union
+from .excepts.exceptions import InvalidCommand
+
+LOG = getLogger('[KASPA_STR]')
+
+
+class AsyncRequestStream:
+    '''asyncio counterpart of `RequestStream`, one `MessageStream` call driven by a reader task instead of threads'''
+
+    def __init__(self, node: Node, stub: Union[RPCStub, P2PStub] = RPCStub, idle_timeout: float = None, max_receive_size=(1024**2)*4):
+        self._conn = grpc.aio.insecure_channel(
+            f'{node}',
+            options = [
+                ('grpc.max_send_message_length', -1),
+                ('grpc.max_receive_message_length', max_receive_size)
+                    ]
+                )
+        self._message_stream = self._conn.stream_stream(
+            MESSAGE_STREAM_METHODS[stub],
+            request_serializer=serialize_request,
+            response_deserializer=KaspadMessage.FromString,
+                )
+        self.node = node
+        self._idle_timeout = idle_timeout
+        self._call = None
+        self._reader = None
+        self._write_lock = None
+        self.error = None # the error the message stream ended with, if it was not closed
+        self._in_flight = defaultdict(deque) # expected response name -> futures, in the order the requests were sent
+        self._notification_queues = defaultdict(list) # notification name -> queues of the attached subscriptions
+        self.status = CONNECTED
+
+    async def start(self):
+        self.status = CONNECTED
+        self._write_lock = asyncio.Lock()
+        self._call = self._message_stream(timeout=self._idle_timeout)
+        self._reader = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        '''reads until the message stream ends, an error is kept in `error` and handed to the requests in flight, 
+        nobody awaits the reader task to retrieve it'''
+        try:
+            async for resp in self._call:
+                await self.process_output(resp)
+        except (grpc.RpcError, asyncio.CancelledError) as e:
+            self._on_stream_error(e)
+            if self.status != CLOSED:
+                self.error = e
+                LOG.info(f'[{self.node}]: message stream ended; {e}')
+
+    async def close(self):
+        self.status = CLOSED
+        if self._call:
+            self._call.cancel()
+        self._on_stream_error(asyncio.CancelledError())
+        await self._conn.close()
+
+    async def submit(self, command: str, payload: Union[dict, str, None] = None) -> asyncio.Future:
+        '''sends a request, and returns a future which resolves to its response'''
+        request = self._serialize_request(command, payload)
+        response = COMMANDS[command].response
+        if response is None:
+            raise InvalidCommand(self.node, command)
+        future = asyncio.get_running_loop().create_future()
+        async with self._write_lock: # keep queueing and writing in the same order
+            self._in_flight[response].append(future)
+            try:
+                await self._call.write(request)
+            except BaseException: # never sent, nobody is left to wait on the future
+                if future in self._in_flight[response]:
+                    self._in_flight[response].remove(future)
+                raise
+        return future
+
+    def attach(self, command: str, queue: asyncio.Queue):
+        for notification in COMMANDS[command].notifications:
+            self._notification_queues[notification].append(queue)
+
+    def detach(self, command: str, queue: asyncio.Queue):
+        for notification in COMMANDS[command].notifications:
+            if queue in self._notification_queues[notification]:
+                self._notification_queues[notification].remove(queue)
+
+    @property
+    def in_flight(self) -> int:
+        return sum(len(futures) for futures in self._in_flight.values())
+
+    async def process_output(self, output: KaspadMessage):
+        name = output.WhichOneof('payload')
+        pending = self._in_flight.get(name)
+        if pending:
+            future = pending.popleft()
+            if not future.done(): # may have been cancelled by a timeout
+                future.set_result(output)
+            return None
+        for queue in tuple(self._notification_queues.get(name, ())):
+            await queue.put(output) # a bounded queue holds back the reader, and with it the stream
+
+    def _on_stream_error(self, err: Exception):
+        pending = [future for futures in self._in_flight.values() for future in futures]
+        self._in_flight.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(err)
+
+    def _serialize_request(self, command : str, payload : Union[dict, str, None] = None) -> Union[KaspadMessage, bytes]:
+        registered = COMMANDS.get(command)
+        if registered is None:
+            raise InvalidCommand(self.node, command)
+        return registered.build(payload)
+
+    def _serialize_output(self, response: KaspadMessage, raw: bool = False) -> Union[KaspadMessage, dict]:
+        return response if raw else json_format.MessageToDict(response)
@@ -0,0 +1,202 @@
+import json
+import os
+import struct
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging import getLogger
+from typing import Callable, Dict, Iterator, Tuple, Union
+
+from kaspy.protos.rpc_pb2 import RpcBlock
+from kaspy.excepts.exceptions import RPCResponseException
+
+LOG = getLogger('[KASPA_BLK]')
+
+_RECORD_LENGTH = struct.Struct('>I')
+
+
+class BlockDownloader:
+    '''downloads the blocks of the DAG from `low_hash` (default the pruning point) up to the virtual, in hash order.
+
+    the hashes are paged with `getBlocksRequest` without blocks, ahead of delivery. the blocks of each page are fetched as a range,
+    with `getBlocksRequest` from the same low hash, by `workers` threads, spread over the members of a `RPCClientPool` if `client`
+    is one, with at most `window` blocks in flight or waiting to be delivered. blocks missing from a range are fetched with
+    `getBlockRequest`; once a range did not fit `max_receive_size`, all blocks are fetched one by one.
+
+    blocks are handed to `sink(block_hash, block)` as `RpcBlock`s, or appended to a file if `sink` is a path, as length prefixed
+    serialized `RpcBlock`s. with a `checkpoint` path, the end of each fully delivered page is saved, and a new downloader resumes
+    after it; a file sink is truncated to where the checkpoint was taken, so no block is written twice'''
+
+    def __init__(self, client, low_hash: Union[str, None] = None, sink: Union[Callable[[str, RpcBlock], None], str, None] = None,
+                 checkpoint: Union[str, None] = None, workers: int = 8, window: int = 256, include_transactions: bool = True,
+                 timeout: Union[float, None] = 30, retries: int = 3) -> None:
+        self.client = client
+        self.low_hash = low_hash
+        self.sink = sink
+        self.checkpoint = checkpoint
+        self.workers = workers
+        self.window = window
+        self.include_transactions = include_transactions
+        self.downloaded = 0
+        self.pages = 0
+        self.ranges = True # False once a range did not fit, blocks are then fetched one by one
+        self._timeout = timeout
+        self._retries = retries
+        self._file = None
+        self._closed = False
+
+    def close(self):
+        self._closed = True
+
+    def run(self) -> int:
+        '''downloads until the virtual is reached, returns the number of blocks delivered to the sink'''
+        for block_hash, block in self:
+            if self._file is None and self.sink:
+                self.sink(block_hash, block)
+        return self.downloaded
+
+    def __iter__(self) -> Iterator[Tuple[str, RpcBlock]]:
+        state = self._load_checkpoint()
+        low_hash = state.get('low_hash') or self.low_hash or self._pruning_point()
+        self.downloaded = state.get('blocks', 0)
+        if isinstance(self.sink, str):
+            self._open_file(state.get('offset', 0))
+        pool = ThreadPoolExecutor(self.workers)
+        pager = ThreadPoolExecutor(1)
+        pages = deque() # (hashes, future of the blocks of their range by hash), in order
+        queued = 0 # hashes in `pages`
+        try:
+            next_page = pager.submit(self._page, low_hash)
+            while not self._closed:
+                while next_page is not None and (not pages or queued < self.window): # ranges of the next pages download meanwhile
+                    hashes = next_page.result()
+                    if not hashes: # reached the virtual
+                        next_page = None
+                        break
+                    next_page = pager.submit(self._page, hashes[-1])
+                    pages.append((hashes, pool.submit(self._range, low_hash)))
+                    queued += len(hashes)
+                    low_hash = hashes[-1]
+                if not pages:
+                    break
+                hashes, blocks = pages.popleft()
+                queued -= len(hashes)
+                blocks = blocks.result()
+                in_flight = deque()
+                for block_hash in hashes:
+                    if self._closed:
+                        return None
+                    block = blocks.get(block_hash)
+                    in_flight.append((block_hash, self._fetched(block) if block is not None else pool.submit(self._block, block_hash)))
+                    if len(in_flight) >= self.window:
+                        yield self._deliver(*in_flight.popleft())
+                while in_flight:
+                    yield self._deliver(*in_flight.popleft())
+                self.pages += 1
+                self._save_checkpoint(hashes[-1])
+        finally:
+            self._closed = True
+            pool.shutdown(wait=False)
+            pager.shutdown(wait=False)
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def _deliver(self, block_hash: str, future) -> Tuple[str, RpcBlock]:
+        block = future.result()
+        if self._file:
+            data = block.SerializeToString()
+            self._file.write(_RECORD_LENGTH.pack(len(data)))
+            self._file.write(data)
+        self.downloaded += 1
+        return block_hash, block
+
+    def _page(self, low_hash: str) -> list:
+        '''hashes after `low_hash`, an empty list once there are none'''
+        resp = self.client.request('getBlocksRequest', {'lowHash': low_hash, 'includeBlocks': False}, timeout=self._timeout, raw=True)
+        page = resp.getBlocksResponse
+        if page.error.message:
+            raise RPCResponseException(self.client.node, 'getBlocksRequest', page.error.message)
+        return [block_hash for block_hash in page.blockHashes if block_hash != low_hash]
+
+    def _range(self, low_hash: str) -> Dict[str, RpcBlock]:
+        '''the blocks of the page after `low_hash` by hash, none once a range did not fit `max_receive_size`'''
+        if not self.ranges:
+            return {}
+        payload = {'lowHash': low_hash, 'includeBlocks': True, 'includeTransactions': self.include_transactions}
+        try:
+            page = self.client.request('getBlocksRequest', payload, timeout=self._timeout, raw=True).getBlocksResponse
+        except RPCResponseException as e:
+            if e.code != 'RESOURCE_EXHAUSTED':
+                raise e
+            LOG.debug(e)
+            self.ranges = False # the next ranges would not fit either
+            return {}
+        if page.error.message:
+            raise RPCResponseException(self.client.node, 'getBlocksRequest', page.error.message)
+        return {block.verboseData.hash: block for block in page.blocks}
+    
+    @staticmethod
+    def _fetched(block: RpcBlock) -> Future:
+        future = Future()
+        future.set_result(block)
+        return future
+
+    def _block(self, block_hash: str) -> RpcBlock:
+        payload = {'hash': block_hash, 'includeTransactions': self.include_transactions}
+        for attempt in range(self._retries + 1):
+            try:
+                resp = self.client.request('getBlockRequest', payload, timeout=self._timeout, raw=True).getBlockResponse
+                if resp.error.message:
+                    raise RPCResponseException(self.client.node, 'getBlockRequest', resp.error.message)
+                return resp.block
+            except Exception as e:
+                if attempt == self._retries or self._closed:
+                    raise e
+                LOG.debug(e)
+
+    def _pruning_point(self) -> str:
+        return self.client.request('getBlockDagInfoRequest', timeout=self._timeout, raw=True).getBlockDagInfoResponse.pruningPointHash
+
+    # files
+
+    def _open_file(self, offset: int):
+        directory = os.path.dirname(self.sink)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.sink, 'r+b' if os.path.exists(self.sink) else 'w+b')
+        self._file.truncate(offset) # drops blocks written after the last checkpoint
+        self._file.seek(offset)
+
+    def _load_checkpoint(self) -> dict:
+        if not self.checkpoint:
+            return {}
+        try:
+            with open(self.checkpoint, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            LOG.debug(e)
+            return {}
+
+    def _save_checkpoint(self, low_hash: str):
+        if not self.checkpoint:
+            return None
+        state = {'low_hash': low_hash, 'blocks': self.downloaded, 'saved': time.time()}
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            state['offset'] = self._file.tell()
+        tmp_path = f'{self.checkpoint}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.checkpoint)
+
+    @staticmethod
+    def read_file(path: str) -> Iterator[RpcBlock]:
+        '''the blocks of a file sink, in the order they were downloaded'''
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(_RECORD_LENGTH.size)
+                if len(header) < _RECORD_LENGTH.size:
+                    return None
+                yield RpcBlock.FromString(f.read(_RECORD_LENGTH.unpack(header)[0]))
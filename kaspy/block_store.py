@@ -0,0 +1,127 @@
+import os
+import struct
+import threading
+from collections import OrderedDict
+from logging import getLogger
+from typing import Dict, Union
+
+from kaspy.protos.rpc_pb2 import RpcBlock
+
+LOG = getLogger('[KASPA_BLK]')
+
+_INDEX_ENTRY = struct.Struct('>32sQIB') # block hash, offset and length in the segment file, flags
+_WITH_TRANSACTIONS = 1
+
+
+class BlockStore:
+    '''blocks by hash, in a memory LRU of `memory_size` blocks, and with a `path` in an append only segment file.
+
+    the segment file holds the serialized blocks back to back, `<path>.idx` the hash, offset, length and flags of each,
+    so a store is reopened without reading the blocks. blocks are immutable, so nothing is ever overwritten,
+    a block fetched with transactions later on is appended again and replaces its header only entry in the index'''
+
+    def __init__(self, path: Union[str, None] = None, memory_size: int = 1024) -> None:
+        self.path = path
+        self.memory_size = memory_size
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict() # hash -> (flags, block)
+        self._index = {} # hash -> (offset, length, flags)
+        self._lock = threading.Lock()
+        self._segment = None
+        self._index_file = None
+        if path:
+            self._open(path)
+
+    def _open(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._segment = open(path, 'a+b')
+        self._index_file = open(f'{path}.idx', 'a+b')
+        size = os.path.getsize(path)
+        self._index_file.seek(0)
+        data = self._index_file.read()
+        for start in range(0, len(data) - len(data) % _INDEX_ENTRY.size, _INDEX_ENTRY.size):
+            block_hash, offset, length, flags = _INDEX_ENTRY.unpack_from(data, start)
+            if offset + length > size: # the block never made it to disk
+                LOG.debug(f'[{path}]: dropping index entry past the end of the segment file')
+                continue
+            self._index[block_hash.hex()] = (offset, length, flags)
+
+    def close(self):
+        with self._lock:
+            for f in (self._segment, self._index_file):
+                if f:
+                    f.close()
+            self._segment = self._index_file = None
+
+    def _flags(self, block_hash: str) -> Union[int, None]:
+        if block_hash in self._memory:
+            return self._memory[block_hash][0]
+        if block_hash in self._index:
+            return self._index[block_hash][2]
+        return None
+
+    def has(self, block_hash: str, include_transactions: bool = True) -> bool:
+        flags = self._flags(block_hash)
+        return flags is not None and bool(flags & _WITH_TRANSACTIONS or not include_transactions)
+
+    def get(self, block_hash: str, include_transactions: bool = True) -> Union[RpcBlock, None]:
+        '''returns the block, without its transactions if `include_transactions` is False, or None if it is not held'''
+        with self._lock:
+            if not self.has(block_hash, include_transactions):
+                self.misses += 1
+                return None
+            self.hits += 1
+            if block_hash in self._memory:
+                self._memory.move_to_end(block_hash)
+                flags, block = self._memory[block_hash]
+            else:
+                offset, length, flags = self._index[block_hash]
+                self._segment.seek(offset)
+                block = RpcBlock.FromString(self._segment.read(length))
+                self._remember(block_hash, flags, block)
+        if not include_transactions and block.transactions:
+            stripped = RpcBlock()
+            stripped.CopyFrom(block)
+            del stripped.transactions[:]
+            return stripped
+        return block
+
+    def put(self, block: RpcBlock, block_hash: Union[str, None] = None, with_transactions: bool = True):
+        '''stores `block`, unless it is held already with at least as much data'''
+        block_hash = block_hash or block.verboseData.hash
+        if not block_hash:
+            return None
+        flags = _WITH_TRANSACTIONS if with_transactions else 0
+        with self._lock:
+            held = self._flags(block_hash)
+            if held is not None and held >= flags:
+                return None
+            self._remember(block_hash, flags, block)
+            if self._segment:
+                data = block.SerializeToString()
+                self._segment.seek(0, os.SEEK_END)
+                offset = self._segment.tell()
+                self._segment.write(data)
+                self._segment.flush()
+                self._index_file.write(_INDEX_ENTRY.pack(bytes.fromhex(block_hash), offset, len(data), flags))
+                self._index_file.flush()
+                self._index[block_hash] = (offset, len(data), flags)
+
+    def _remember(self, block_hash: str, flags: int, block: RpcBlock):
+        self._memory[block_hash] = (flags, block)
+        self._memory.move_to_end(block_hash)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'memory': len(self._memory), 'disk': len(self._index)}
+
+    def __contains__(self, block_hash: str) -> bool:
+        return self._flags(block_hash) is not None
+
+    def __len__(self) -> int:
+        return len(set(self._memory) | set(self._index))
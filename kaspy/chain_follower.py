@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from typing import Iterator, Union
+
+from kaspy.dispatchers import InlineDispatcher
+from kaspy.defines import CHAIN_ADDED, CHAIN_REMOVED
+from kaspy.excepts.exceptions import RPCResponseException
+
+LOG = getLogger('[KASPA_CHN]')
+
+ChainEvent = namedtuple('ChainEvent', ('kind', 'hash', 'accepted_transaction_ids'))
+
+
+class ChainFollower:
+    '''iterates over the changes of the virtual selected parent chain, as `ChainEvent`s of `CHAIN_REMOVED` blocks (high to low)
+    followed by `CHAIN_ADDED` blocks (low to high), from `getVirtualSelectedParentChainFromBlockRequest` pages.
+    a page which only removes blocks is continued from the selected parent of the lowest removed block.
+
+    the next page is requested as soon as a page is handed over, so it arrives while the current one is processed.
+    once caught up, the follower waits for a `virtualSelectedParentChainChangedNotification` (with `notify`), or `poll_interval`.
+    with a `checkpoint` path, the last chain block of each fully processed page is saved, and a new follower resumes from it,
+    so a restart only catches up on the delta; after a crash, at most the page in progress is delivered again.
+
+    starts at the checkpoint, else `start_hash`, else the pruning point'''
+
+    def __init__(self, client, start_hash: Union[str, None] = None, checkpoint: Union[str, None] = None,
+                 include_accepted_transaction_ids: bool = False, notify: bool = True, poll_interval: float = 1,
+                 timeout: Union[float, None] = 30) -> None:
+        self.client = client
+        self.start_hash = start_hash
+        self.checkpoint = checkpoint
+        self.include_accepted_transaction_ids = include_accepted_transaction_ids
+        self.position = None # the chain block the last fully processed page ended at
+        self._notify = notify
+        self._poll_interval = poll_interval
+        self._timeout = timeout
+        self._wake = threading.Event()
+        self._closed = False
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+
+    def __iter__(self) -> Iterator[ChainEvent]:
+        self.position = self._load_checkpoint() or self.start_hash or self._pruning_point()
+        if self._notify:
+            self.client.subscribe('notifyVirtualSelectedParentChainChangedRequest', lambda _: self._wake.set(), raw=True,
+                                  dispatcher=InlineDispatcher())
+        pool = ThreadPoolExecutor(1)
+        try:
+            pending = pool.submit(self._fetch, self.position)
+            while not self._closed:
+                page = pending.result()
+                added = list(page.addedChainBlockHashes)
+                if not added and not page.removedChainBlockHashes: # caught up
+                    self._wake.wait(self._poll_interval)
+                    self._wake.clear()
+                    pending = pool.submit(self._fetch, self.position)
+                    continue
+                position = added[-1] if added else self._fork_point(page.removedChainBlockHashes[-1])
+                pending = pool.submit(self._fetch, position) # prefetch while the page is processed
+                accepted = {block.acceptingBlockHash: tuple(block.acceptedTransactionIds) for block in page.acceptedTransactionIds}
+                for block_hash in page.removedChainBlockHashes:
+                    yield ChainEvent(CHAIN_REMOVED, block_hash, ())
+                for block_hash in added:
+                    yield ChainEvent(CHAIN_ADDED, block_hash, accepted.get(block_hash, ()))
+                self.position = position
+                self._save_checkpoint(position)
+        finally:
+            self._closed = True
+            if self._notify:
+                try:
+                    self.client.unsubscribe('notifyVirtualSelectedParentChainChangedRequest')
+                except Exception as e:
+                    LOG.debug(e)
+            pool.shutdown(wait=False)
+
+    def _fetch(self, start_hash: str):
+        payload = {'startHash': start_hash, 'includeAcceptedTransactionIds': self.include_accepted_transaction_ids}
+        resp = self.client.request('getVirtualSelectedParentChainFromBlockRequest', payload, timeout=self._timeout, raw=True)
+        page = resp.getVirtualSelectedParentChainFromBlockResponse
+        if page.error.message:
+            raise RPCResponseException(self.client.node, 'getVirtualSelectedParentChainFromBlockRequest', page.error.message)
+        return page
+
+    def _fork_point(self, removed_hash: str) -> str:
+        '''the chain block to continue from after a page with only removed blocks, the selected parent of the lowest one'''
+        resp = self.client.request('getBlockRequest', {'hash': removed_hash, 'includeTransactions': False}, timeout=self._timeout, raw=True)
+        block = resp.getBlockResponse
+        parent = block.block.verboseData.selectedParentHash
+        if block.error.message or not parent or parent == self.position: # would request the same page again
+            raise RPCResponseException(self.client.node, 'getVirtualSelectedParentChainFromBlockRequest', 
+                                       f'page removed {removed_hash} without adding blocks, and its selected parent is unknown')
+        return parent
+
+    def _pruning_point(self) -> str:
+        return self.client.request('getBlockDagInfoRequest', timeout=self._timeout, raw=True).getBlockDagInfoResponse.pruningPointHash
+
+    def _load_checkpoint(self) -> Union[str, None]:
+        if not self.checkpoint:
+            return None
+        try:
+            with open(self.checkpoint, 'r') as f:
+                return json.load(f)['hash']
+        except (OSError, ValueError, KeyError) as e:
+            LOG.debug(e)
+            return None
+
+    def _save_checkpoint(self, block_hash: str):
+        '''written to a temporary file first, so a crash never leaves a partial checkpoint'''
+        if not self.checkpoint:
+            return None
+        tmp_path = f'{self.checkpoint}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'hash': block_hash, 'saved': time.time()}, f)
+        os.replace(tmp_path, self.checkpoint)
@@ -1,3 +1,4 @@
+import os
 from kaspy.utils.version_comparer import version as ver
 from . import __version__, __name__
 
@@ -48,5 +49,82 @@ CLOSED = 'closed' # terminates the connection immediatly, does not wait for queu
 
 ClIENT_STATES = (CONNECTED, DISCONNECTED, CLOSED) 
 
+# requests that can be split over a list in their payload, when the response exceeds max_receive_size:
+
+SPLITTABLE_COMMANDS = {
+    'getUtxosByAddressesRequest': 'addresses',
+    'getBalancesByAddressesRequest': 'addresses',
+    'getMempoolEntriesByAddressesRequest': 'addresses',
+}
+
+# requests kaspad may already have run when their message stream failed, they are failed instead of sent again on the reopened stream:
+
+NON_IDEMPOTENT_COMMANDS = frozenset((
+    'submitBlockRequest',
+    'submitTransactionRequest',
+    'addPeerRequest',
+    'banRequest',
+    'unbanRequest',
+    'resolveFinalityConflictRequest',
+    'shutDownRequest',
+))
+
+# seconds a reconnected stream has to answer a getInfoRequest, before the reconnect counts as failed:
+
+RECONNECT_CHECK_TIMEOUT = 5
+
+# routing of requests in a client pool:
+
+LEAST_LOADED = 'least_loaded' # member with the fewest outstanding requests
+LOWEST_LATENCY = 'lowest_latency' # member with the lowest moving average round trip time, weighted by its outstanding requests
+
+# node cache, for auto_connect without a dns seed scan:
+
+NODE_CACHE_PATH = os.path.join('~', '.kaspy', 'nodes.json')
+NODE_CACHE_MAX_AGE = 7 * 24 * 60 * 60 # seconds since a node last answered, before it is dropped from the cache
+NODE_CACHE_MAX_FAILURES = 3 # failed connection attempts in a row, before a node is skipped
+NODE_CACHE_REFRESH_COUNT = 8 # nodes looked up by a background refresh of the cache
+
+# responses cached by a ResponseCache, in seconds, or forever for content addressed lookups:
+
+CACHE_FOREVER = 'forever'
+
+RESPONSE_CACHE_TTLS = {
+    'getCurrentNetworkRequest': 60,
+    'getInfoRequest': 1,
+    'getCoinSupplyRequest': 1,
+    'getBlockDagInfoRequest': 1,
+    'getBlockRequest': CACHE_FOREVER,
+}
+
+# share of a getBlocks page a BlockStore has to hold, to fetch only the missing blocks instead of the whole page:
+
+BLOCK_STORE_MIN_HELD = 0.5
+
+# kinds of ChainFollower events:
+
+CHAIN_ADDED = 'added' # block joined the virtual selected parent chain
+CHAIN_REMOVED = 'removed' # block left it in a reorg
+
+# circuit breaker states, per node:
+
+BREAKER_CLOSED = 'breaker_closed' # requests pass
+BREAKER_OPEN = 'breaker_open' # requests are rejected until the reset timeout passed
+BREAKER_HALF_OPEN = 'breaker_half_open' # a single trial request decides whether to close or re-open
+
+# overflow policies for bounded callback dispatchers:
+
+BLOCK = 'block' # the stream waits for room in the queue
+DROP_OLDEST = 'drop_oldest' # the oldest queued notification is discarded to make room
+RAISE = 'raise' # the notification is rejected, and DispatchQueueFull reported to the dispatcher's `on_error`, never raised in the stream
+
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, RAISE)
+
+# upper bounds of the histogram buckets of ClientMetrics:
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10) # seconds
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608) # bytes
+METRICS_RATE_WINDOW = 10 # seconds notification rates are averaged over
+
 ### for p2p usage, I think I need ###
 USER_AGENT = f'{__version__} {__name__}'
\ No newline at end of file
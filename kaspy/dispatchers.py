@@ -0,0 +1,264 @@
+import time
+from collections import deque
+from logging import getLogger
+from threading import Condition, Thread
+from typing import Any, Callable, Hashable, List, Union
+
+from kaspy.defines import BLOCK, DROP_OLDEST, RAISE, OVERFLOW_POLICIES
+from kaspy.excepts.exceptions import DispatchQueueFull
+
+LOG = getLogger('[KASPA_DSP]')
+
+
+class _BoundedQueue:
+    '''FIFO queue with an explicit overflow policy, `maxsize` of 0 means unbounded'''
+
+    def __init__(self, maxsize: int, overflow: str) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'unknown overflow policy {overflow}, use one of {OVERFLOW_POLICIES}')
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.dropped = 0
+        self._items = deque()
+        self._cond = Condition()
+        self._closed = False
+
+    def put(self, item):
+        with self._cond:
+            if self.maxsize and len(self._items) >= self.maxsize:
+                if self.overflow == BLOCK:
+                    while len(self._items) >= self.maxsize and not self._closed:
+                        self._cond.wait()
+                elif self.overflow == DROP_OLDEST:
+                    self._items.popleft()
+                    self.dropped += 1
+                elif self.overflow == RAISE:
+                    raise DispatchQueueFull(self.maxsize)
+            self._items.append(item)
+            self._cond.notify_all()
+
+    def get(self) -> Union[Any, None]:
+        '''blocks until an item is available, returns None once closed and drained'''
+        with self._cond:
+            while not self._items and not self._closed:
+                self._cond.wait()
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class InlineDispatcher:
+    '''runs callbacks in the stream's reader thread, in order, a slow callback holds back the stream'''
+
+    def dispatch(self, callback: Callable[[Any], Any], notification: Any):
+        try:
+            callback(notification)
+        except Exception as e: # must not end the stream
+            LOG.exception(e)
+
+    def close(self):
+        pass
+
+    @property
+    def queue_depth(self) -> int:
+        return 0
+
+
+class PoolDispatcher:
+    '''runs callbacks on a fixed number of worker threads, picked up in the order notifications arrived.
+
+    `dispatch` is called by the stream's reader thread, so it never raises: notifications it cannot queue, i.e. with the RAISE
+    overflow policy, are counted in `errors`, and the error is handed to `on_error`, or logged without one'''
+
+    def __init__(self, workers: int = 1, maxsize: int = 1024, overflow: str = BLOCK,
+                 on_error: Union[Callable[[Exception], Any], None] = None) -> None:
+        self._queue = _BoundedQueue(maxsize, overflow)
+        self._on_error = on_error
+        self.errors = 0
+        self._workers = [Thread(target=self._work, args=(self._queue,), daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def dispatch(self, callback: Callable[[Any], Any], notification: Any):
+        try:
+            self._queue.put((callback, notification))
+        except DispatchQueueFull as e:
+            self._report(e)
+
+    def _report(self, err: Exception):
+        self.errors += 1
+        if self._on_error is None:
+            LOG.warning(err)
+            return None
+        try:
+            self._on_error(err)
+        except Exception as e:
+            LOG.exception(e)
+
+    def close(self):
+        '''stops the workers once queued notifications are delivered'''
+        self._queue.close()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def dropped(self) -> int:
+        return self._queue.dropped
+
+    def _work(self, queue: _BoundedQueue):
+        while True:
+            item = queue.get()
+            if item is None:
+                break
+            callback, notification = item
+            try:
+                callback(notification)
+            except Exception as e:
+                LOG.exception(e)
+
+
+class KeyedPoolDispatcher(PoolDispatcher):
+    '''runs callbacks on a fixed number of workers, notifications with the same `key` are delivered in order by the same worker
+
+    i.e. `key=lambda n: n['utxosChangedNotification']['added'][0]['address']`'''
+
+    def __init__(self, key: Callable[[Any], Hashable], workers: int = 4, maxsize: int = 1024, overflow: str = BLOCK,
+                 on_error: Union[Callable[[Exception], Any], None] = None) -> None:
+        self._key = key
+        self._on_error = on_error
+        self.errors = 0
+        self._queues = [_BoundedQueue(maxsize, overflow) for _ in range(workers)]
+        self._workers = [Thread(target=self._work, args=(queue,), daemon=True) for queue in self._queues]
+        for worker in self._workers:
+            worker.start()
+
+    def dispatch(self, callback: Callable[[Any], Any], notification: Any):
+        try:
+            self._queues[hash(self._key(notification)) % len(self._queues)].put((callback, notification))
+        except Exception as e: # a full queue, or a failing `key`
+            self._report(e)
+
+    def close(self):
+        for queue in self._queues:
+            queue.close()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues)
+
+    @property
+    def dropped(self) -> int:
+        return sum(queue.dropped for queue in self._queues)
+
+
+class BatchingDispatcher:
+    '''hands callbacks lists of notifications, once `batch_size` are collected or `max_delay` seconds after the oldest one arrived
+
+    the stream only appends to a buffer per callback, batches are passed on to `dispatcher` from a flusher thread. the buffers hold
+    at most `maxsize` notifications in all, beyond that `overflow` applies as for `PoolDispatcher`, errors are handed to `on_error`'''
+
+    def __init__(self, batch_size: Union[int, None] = 100, max_delay: Union[float, None] = 0.1, dispatcher = None,
+                 maxsize: int = 1024, overflow: str = BLOCK, on_error: Union[Callable[[Exception], Any], None] = None) -> None:
+        if not (batch_size or max_delay):
+            raise ValueError('a batch_size or a max_delay is required')
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'unknown overflow policy {overflow}, use one of {OVERFLOW_POLICIES}')
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.dropped = 0
+        self.errors = 0
+        self._on_error = on_error
+        self._dispatcher = dispatcher if dispatcher else PoolDispatcher()
+        self._buffers = {} # callback -> deque of (arrived at, notification), oldest first
+        self._size = 0
+        self._cond = Condition()
+        self._closed = False
+        self._flusher = Thread(target=self._flush, daemon=True)
+        self._flusher.start()
+
+    _report = PoolDispatcher._report
+
+    def dispatch(self, callback: Callable[[List[Any]], Any], notification: Any):
+        full = None
+        with self._cond:
+            if self.maxsize and self._size >= self.maxsize:
+                if self.overflow == BLOCK:
+                    while self._size >= self.maxsize and not self._closed:
+                        self._cond.wait()
+                elif self.overflow == DROP_OLDEST:
+                    oldest = min(self._buffers, key=lambda buffered: self._buffers[buffered][0][0])
+                    self._buffers[oldest].popleft()
+                    if not self._buffers[oldest]:
+                        del self._buffers[oldest]
+                    self._size -= 1
+                    self.dropped += 1
+                else:
+                    full = DispatchQueueFull(self.maxsize)
+            if full is None:
+                buffer = self._buffers.setdefault(callback, deque())
+                buffer.append((time.monotonic(), notification))
+                self._size += 1
+                if len(buffer) == 1 or (self.batch_size and len(buffer) >= self.batch_size): # start the delay, or flush
+                    self._cond.notify_all()
+        if full is not None: # reported outside the lock, `on_error` may take its time
+            self._report(full)
+
+    def close(self):
+        '''flushes what is buffered, then closes the underlying dispatcher'''
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._size + self._dispatcher.queue_depth
+
+    def _due(self) -> Union[Callable[[List[Any]], Any], None]:
+        '''a callback with a batch ready, None while there is none'''
+        now = time.monotonic()
+        for callback, buffer in self._buffers.items():
+            if self._closed or (self.batch_size and len(buffer) >= self.batch_size):
+                return callback
+            if self.max_delay is not None and now - buffer[0][0] >= self.max_delay:
+                return callback
+        return None
+
+    def _next_due(self) -> Union[float, None]:
+        '''seconds until the oldest buffered notification is due'''
+        if self.max_delay is None or not self._buffers:
+            return None
+        oldest = min(buffer[0][0] for buffer in self._buffers.values())
+        return max(0, oldest + self.max_delay - time.monotonic())
+
+    def _flush(self):
+        while True:
+            with self._cond:
+                callback = self._due()
+                while callback is None:
+                    if self._closed:
+                        self._dispatcher.close()
+                        return None
+                    self._cond.wait(self._next_due())
+                    callback = self._due()
+                buffer = self._buffers[callback]
+                size = min(self.batch_size, len(buffer)) if self.batch_size else len(buffer)
+                batch = [buffer.popleft()[1] for _ in range(size)]
+                if not buffer:
+                    del self._buffers[callback]
+                self._size -= size
+                self._cond.notify_all() # room for a waiting `dispatch`
+            self._dispatcher.dispatch(callback, batch)
@@ -4,6 +4,7 @@ class RPCResponseException(Exception):
     def __init__(self, node, code, details):
         '''Exception that is raised when server cannot process a request'''
         super().__init__(f'{code}: did not get valid response from host {node}; {details}')
+        self.code = code
         
 class CLientClosed(Exception):
     def __init__(self, node, command):
@@ -41,4 +42,18 @@ class SubscriptionCannotBeUnsubscribed(Exception):
      def __init__(self, node, command):
         '''Exception that is raised when command is not registered anywhere in the proto files'''
         super().__init__(f'cannot unsubscribe to {command} in {node}')
-    
+
+class NoNodeAvailable(Exception):
+    def __init__(self, subnetwork):
+        '''Exception that is raised when auto_connect runs out of nodes before one passed its checks'''
+        super().__init__(f'could not auto connect; no {subnetwork} node available passed the checks')
+
+class DispatchQueueFull(Exception):
+    def __init__(self, maxsize):
+        '''Exception that is reported when a dispatcher with the RAISE overflow policy has no room left for a notification'''
+        super().__init__(f'could not dispatch notification; queue is full with {maxsize} notifications')
+
+class CircuitOpen(Exception):
+    def __init__(self, node, command, reason):
+        '''Exception that is raised when the circuit breaker of a node rejects a request'''
+        super().__init__(f'did not send {command} to host {node}; circuit breaker is open, {reason}')
@@ -0,0 +1,210 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from logging import getLogger
+from typing import Dict, Union
+
+from kaspy.network.node import Node
+from kaspy.defines import CONNECTED, BREAKER_CLOSED, BREAKER_OPEN, BREAKER_HALF_OPEN
+from kaspy.log_handler.log_messages import network as net_lm
+
+LOG = getLogger('[KASPA_HLT]')
+
+
+class CircuitBreaker:
+    '''trips once `failure_rate` of the last `window` outcomes failed (with at least `min_samples` of them), and then
+    rejects requests for `reset_timeout` seconds. after that it half opens, and lets a single trial through,
+    which closes it again on success, or re-opens it on failure'''
+
+    def __init__(self, failure_rate: float = 0.5, window: int = 20, min_samples: int = 5, reset_timeout: float = 10) -> None:
+        self.failure_rate = failure_rate
+        self.min_samples = min_samples
+        self.reset_timeout = reset_timeout
+        self.state = BREAKER_CLOSED
+        self.reason = None
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = None
+        self._trial_at = None # start of the trial in flight while half open
+        self._lock = threading.Lock()
+
+    @property
+    def error_rate(self) -> float:
+        return self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+
+    @property
+    def available(self) -> bool:
+        '''whether `allow` would let a request through, without taking the trial of a half open breaker'''
+        if self.state == BREAKER_CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == BREAKER_OPEN:
+            return now - self._opened_at >= self.reset_timeout
+        return self._trial_at is None or now - self._trial_at >= self.reset_timeout
+
+    def allow(self) -> bool:
+        with self._lock:
+            if not self.available:
+                return False
+            if self.state != BREAKER_CLOSED: # the trial of a half open breaker, a trial that never returned is replaced after reset_timeout
+                self.state = BREAKER_HALF_OPEN
+                self._trial_at = time.monotonic()
+            return True
+
+    def record(self, ok: bool):
+        with self._lock:
+            if self.state == BREAKER_HALF_OPEN:
+                if ok:
+                    self.state, self.reason, self._trial_at = BREAKER_CLOSED, None, None
+                    self._outcomes.clear()
+                else:
+                    self._open('trial failed')
+                return None
+            if self.state == BREAKER_OPEN: # answers to requests sent before it tripped
+                return None
+            self._outcomes.append(ok)
+            if len(self._outcomes) >= self.min_samples and self.error_rate >= self.failure_rate:
+                self._open(f'error rate of {self.error_rate:.0%}')
+
+    def trip(self, reason: Union[str, None] = None):
+        with self._lock:
+            self._open(reason)
+
+    def _open(self, reason: Union[str, None]):
+        self.state, self.reason = BREAKER_OPEN, reason
+        self._opened_at, self._trial_at = time.monotonic(), None
+        self._outcomes.clear()
+
+
+class NodeHealth:
+    '''what the monitor knows about a node'''
+
+    def __init__(self, latency_alpha: float) -> None:
+        self.latency = None # moving average of probe and request round trip times, in seconds
+        self.requests = 0
+        self.failures = 0
+        self.synced = None
+        self.daa_score = None
+        self.last_probe = None
+        self._latency_alpha = latency_alpha
+
+    def observe(self, ok: bool, latency: Union[float, None] = None):
+        self.requests += 1
+        if not ok:
+            self.failures += 1
+        if latency is not None:
+            self.latency = latency if self.latency is None else self.latency + self._latency_alpha * (latency - self.latency)
+
+
+class HealthMonitor:
+    '''probes the nodes of the watched clients every `interval` seconds, with `getInfoRequest` and `getBlockDagInfoRequest`.
+
+    every node gets a `CircuitBreaker`, fed by the probes and the requests of the clients. it trips on a high error rate,
+    when the node reports it is not synced, or when its virtual DAA score lags the best watched node by more than `max_daa_lag`.
+    clients reject requests to a node with an open breaker with `CircuitOpen`, a `RPCClientPool` routes around it'''
+
+    def __init__(self, interval: float = 5, timeout: float = 2, max_daa_lag: int = 600, failure_rate: float = 0.5, window: int = 20,
+                 min_samples: int = 5, reset_timeout: float = 10, latency_alpha: float = 0.2) -> None:
+        self.interval = interval
+        self.timeout = timeout
+        self.max_daa_lag = max_daa_lag
+        self._breaker_kwargs = dict(failure_rate=failure_rate, window=window, min_samples=min_samples, reset_timeout=reset_timeout)
+        self._latency_alpha = latency_alpha
+        self._clients = []
+        self._breakers = {} # node -> CircuitBreaker
+        self._health = {} # node -> NodeHealth
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def watch(self, client):
+        '''probes the node of `client`, and has it consult the breaker of its node before each request'''
+        with self._lock:
+            if client not in self._clients:
+                self._clients.append(client)
+        client.health = self
+
+    def unwatch(self, client):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+        client.health = None
+
+    def close(self):
+        self._closed.set()
+
+    def breaker(self, node: Union[Node, str]) -> CircuitBreaker:
+        with self._lock:
+            if str(node) not in self._breakers:
+                self._breakers[str(node)] = CircuitBreaker(**self._breaker_kwargs)
+            return self._breakers[str(node)]
+
+    def health(self, node: Union[Node, str]) -> NodeHealth:
+        with self._lock:
+            if str(node) not in self._health:
+                self._health[str(node)] = NodeHealth(self._latency_alpha)
+            return self._health[str(node)]
+
+    def record(self, node: Union[Node, str], ok: bool, latency: Union[float, None] = None):
+        '''feeds the outcome of a request to the node's health and breaker'''
+        self.health(node).observe(ok, latency)
+        self.breaker(node).record(ok)
+
+    def score(self, node: Union[Node, str]) -> float:
+        '''lower is better, the moving average latency weighted by the error rate, infinite while the breaker is open'''
+        breaker = self.breaker(node)
+        if not breaker.available:
+            return float('inf')
+        latency = self.health(node).latency
+        return (latency if latency is not None else self.timeout) * (1 + breaker.error_rate)
+
+    @property
+    def scores(self) -> Dict[str, float]:
+        with self._lock:
+            nodes = set(self._health) | set(self._breakers)
+        return {node: self.score(node) for node in nodes}
+
+    def _run(self):
+        pool = ThreadPoolExecutor(4)
+        while not self._closed.wait(self.interval):
+            with self._lock:
+                clients = [client for client in self._clients if client.client_status == CONNECTED]
+            wait([pool.submit(self.probe, client) for client in clients])
+            self._check_lag(clients)
+        pool.shutdown(wait=False)
+
+    def probe(self, client):
+        '''one round of probes against the node of `client`, skipped while its breaker is open'''
+        node, stream = client.node, client.request_stream
+        if not self.breaker(node).allow():
+            return None
+        health = self.health(node)
+        start = time.perf_counter()
+        try: # straight on the stream, so the probes are not rejected by the breaker they feed
+            info = client.unwrap_response(stream.wait(stream.submit('getInfoRequest'), self.timeout, raw=True))
+            dag_info = client.unwrap_response(stream.wait(stream.submit('getBlockDagInfoRequest'), self.timeout, raw=True))
+        except Exception as e:
+            LOG.debug(e)
+            self.record(node, False)
+            return None
+        self.record(node, True, (time.perf_counter() - start) / 2)
+        health.synced = info.isSynced
+        health.daa_score = dag_info.virtualDaaScore
+        health.last_probe = time.time()
+        if not info.isSynced:
+            self._trip(node, 'node is not synced')
+
+    def _check_lag(self, clients):
+        scores = {str(client.node): self.health(client.node).daa_score for client in clients}
+        scores = {node: score for node, score in scores.items() if score is not None}
+        if not scores:
+            return None
+        best = max(scores.values())
+        for node, score in scores.items():
+            if best - score > self.max_daa_lag:
+                self._trip(node, f'virtual DAA score lags by {best - score}')
+
+    def _trip(self, node: Union[Node, str], reason: str):
+        LOG.info(net_lm.NODE_UNHEALTHY(node, reason))
+        self.breaker(node).trip(reason)
@@ -0,0 +1,61 @@
+import threading
+from logging import getLogger
+from typing import Any, Callable, Tuple
+
+LOG = getLogger('[KASPA_HOK]')
+
+EVENTS = ('pre_send', 'post_send', 'response_received', 'decode_finished', 'callback_start', 'callback_end', 'reconnect', 'node_selected')
+
+
+class Hooks:
+    '''registry of tracing hooks, called synchronously in the thread the event happens in, keep them fast.
+
+    events, and what their hooks are called with:
+
+        pre_send(node, command, request)              a request is queued for the message stream
+        post_send(node, command, request)             the message stream takes it, to write it to the channel
+        response_received(node, command, request, response)   its response arrived, before it is handed to the waiting caller
+        decode_finished(node, message, seconds, size) a received message was parsed, by its oneof field name
+        callback_start(command, notification)         a subscription callback is about to run, in the dispatcher's worker
+        callback_end(command, notification, seconds, error)   it returned, or raised `error`
+        reconnect(node, reason)                       a message stream is reopened, or a client reconnects
+        node_selected(node, reason)                   `auto_connect` settled on a node, or a pool routed a request to a member
+
+    `request` is the future of the request, the same object for all its events. each event holds a tuple of hooks,
+    replaced on registration, so call sites only pay for a truth test while an event has no hooks'''
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.clear()
+
+    def register(self, event: str, hook: Callable[..., Any]) -> Callable[..., Any]:
+        self._check(event)
+        with self._lock:
+            setattr(self, event, getattr(self, event) + (hook,))
+        return hook
+
+    def unregister(self, event: str, hook: Callable[..., Any]):
+        self._check(event)
+        with self._lock:
+            setattr(self, event, tuple(registered for registered in getattr(self, event) if registered is not hook))
+
+    @staticmethod
+    def _check(event: str):
+        if event not in EVENTS:
+            raise ValueError(f'unknown hook event {event}, use one of {EVENTS}')
+
+    def clear(self):
+        with self._lock:
+            for event in EVENTS:
+                setattr(self, event, ())
+
+    def fire(self, hooks: Tuple[Callable[..., Any], ...], *args):
+        '''calls `hooks` (one event's tuple), a failing hook is logged, and never fails the client'''
+        for hook in hooks:
+            try:
+                hook(*args)
+            except Exception as e:
+                LOG.exception(e)
+
+
+HOOKS = Hooks() # the registry consulted by all clients and streams
@@ -2,22 +2,35 @@ import base64
 from distutils.log import Log
 
 import grpc
+import random
 import time
-from collections import defaultdict
-from typing import Any, Callable, Dict, Iterator, Union
+import threading
+from collections import deque
+from itertools import chain
+from queue import Empty, SimpleQueue
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Union
 from requests import get
 import base64
 import uuid
 from logging import DEBUG, INFO, getLogger, basicConfig
 
-from kaspy.streams import P2PRequestStream, RequestStream, SubcribeStream
+from kaspy.utils.commands import COMMANDS
+from kaspy.streams import NotificationStream, P2PRequestStream, RequestStream, Subscription
+from kaspy.health import HealthMonitor
+from kaspy.response_cache import ResponseCache
+from kaspy.block_store import BlockStore
+from kaspy.metrics import ClientMetrics
+from kaspy.hooks import HOOKS
+from kaspy.dispatchers import BatchingDispatcher, InlineDispatcher, KeyedPoolDispatcher, PoolDispatcher
 from kaspy.network.node import UNKNOWEN, Node, node_acquirer
+from kaspy.network.node_cache import NodeCache
 from kaspy.protos.messages_pb2 import KaspadMessage, _KASPADMESSAGE
 from kaspy.protos.messages_pb2_grpc import P2PStub, RPCStub
-from kaspy.defines import MAINNET, P2P_DEF_PORTS, P2P_SERVICE, RPC_DEF_PORTS, RPC_SERVICE, CONNECTED, CLOSED, DISCONNECTED, USER_AGENT
+from kaspy.defines import DROP_OLDEST, MAINNET, P2P_DEF_PORTS, P2P_SERVICE, RPC_DEF_PORTS, RPC_SERVICE, CONNECTED, CLOSED, DISCONNECTED, USER_AGENT, SPLITTABLE_COMMANDS, BLOCK_STORE_MIN_HELD, LEAST_LOADED, LOWEST_LATENCY, NODE_CACHE_PATH, NODE_CACHE_REFRESH_COUNT, RECONNECT_CHECK_TIMEOUT
 from kaspy.log_handler.log_messages import client as cli_lm
 from kaspy.utils.version_comparer import version as ver
-from kaspy.excepts.exceptions import CLientClosed, ClientDisconnected, CommandIsNotSubcribable, InvalidCommand, RPCResponseException, RPCServiceUnavailable, SubscriptionCannotBeUnsubscribed
+from kaspy.excepts.exceptions import CircuitOpen, CLientClosed, ClientDisconnected, CommandIsNotSubcribable, InvalidCommand, RPCResponseException, RPCServiceUnavailable, SubscriptionCannotBeUnsubscribed
 
 
 basicConfig(level=INFO)
@@ -36,12 +49,22 @@ class BaseClient(_KaspaClient):
         self._is_connected = lambda : True if self._chan else False
         self.server_status = str #hold server status from grpc.RpcErrors
         self.client_status = str #hold client status : CONNECTED, DISCONNECTED or CLOSED
-        self._subscriptions = defaultdict(dict) #hold subscription streams
+        self._subscriptions = {} #hold subscriptions multiplexed onto the request stream
+        self._notification_streams = [] #hold pull based subscriptions, each on its own message stream
+        self._chunk_sizes = {} #hold the number of list items per request known to fit max_receive_size, per splittable command
         self.request_stream = RequestStream
         self.restablish_new_connection  = None
         self._retry_count = None
         self._retry_wait = None
+        self._connections = 0 #count `connect` calls, so concurrent failures on one connection reconnect once
+        self._reconnect_lock = threading.RLock()
+        self._stream_params = {} #hold the idle_timeout and max_receive_size of the last `connect`, to reconnect with
         self._auto_conn_params = None
+        self.raw = False # if True, responses and notifications are returned as `KaspadMessage` instead of dicts
+        self.health = None # HealthMonitor watching the client, set by `HealthMonitor.watch`
+        self.response_cache = None # ResponseCache consulted by `request`, if set
+        self.block_store = None # BlockStore serving `getBlockRequest` and `getBlocksRequest`, if set
+        self.metrics = None # ClientMetrics recorded by the streams, set by `enable_metrics`
         self.service
     
     # display node infos through the client:
@@ -82,10 +105,18 @@ class BaseClient(_KaspaClient):
         self.client_status = CONNECTED
         self._retry_count = retry_count if retry_count else 0
         self._retry_wait = retry_wait if retry_wait else 0
+        self._stream_params = dict(idle_timeout=idle_timeout, max_receive_size=max_receive_size)
+        self._connections += 1
         self.node = Node(host, port)
         LOG.info(cli_lm.CONN_ESTABLISHING(self.node))
-        self.request_stream = P2PRequestStream(node=self.node, stub=self._get_service_stub(), idle_timeout=idle_timeout, max_receive_size=max_receive_size)
+        if isinstance(self.request_stream, (RequestStream, P2PRequestStream)) and self.request_stream.status != CLOSED:
+            self.request_stream.close() # replaced, i.e. on a retry
+        stream_type = RequestStream if self.service == RPC_SERVICE else P2PRequestStream
+        self.request_stream = stream_type(node=self.node, stub=self._get_service_stub(), idle_timeout=idle_timeout, max_receive_size=max_receive_size)
+        self.request_stream.metrics = self.metrics
         self.request_stream.start()
+        for subscription in tuple(self._subscriptions.values()): # the node forgets subscriptions with the stream they were made on
+            self.request_stream.attach(subscription)
         LOG.info(cli_lm.CONN_ESTABLISHED(self.node))
     
     def auto_connect(*args, **kwargs) -> NotImplementedError:
@@ -99,8 +130,6 @@ class BaseClient(_KaspaClient):
     # disconnecting /closing opperations
     
     def disconnect(self) -> None:
-        for sub in self._subscriptions.values():
-            sub.disconnect()
         self.client_status = DISCONNECTED
         self.request_stream.disconnect()
     
@@ -119,24 +148,117 @@ class BaseClient(_KaspaClient):
         sub_msg =  command.replace('Request', 'Notification')[6:]
         return sub_msg[0].lower() + sub_msg[1:]
     
-    def subscribe(self, command: str,  callback: Callable[[dict], Any], payload: Union[dict, str, None] = None, idle_timeout: Union[float, None] = None) -> None:
-        #if self._is_subscription_request(command):
-        self._subscriptions[command] = SubcribeStream(self.node, command, payload, callback, 
-                                                          self._get_service_stub(), idle_timeout=idle_timeout)
-        self._subscriptions[command].start()
-        #else:
-            #raise CommandIsNotSubcribable(self.node, command)
+    def subscribe(self, command: str,  callback: Callable[[Union[dict, KaspadMessage]], Any], payload: Union[dict, str, None] = None, idle_timeout: Union[float, None] = None, 
+                  raw: Union[bool, None] = None, dispatcher: Union[InlineDispatcher, PoolDispatcher, KeyedPoolDispatcher, BatchingDispatcher, None] = None, 
+                  timeout: Union[float, int, None] = 10, batch_size: Union[int, None] = None, max_delay: Union[float, None] = None) -> None:
+        '''subscribes `callback` to the notifications of `command`, multiplexed onto the request stream
+        
+        `dispatcher` decides how callbacks are run, defaults to a single ordered worker with a bounded queue, dropping the oldest 
+        notification when full. notifications are dispatched in the request stream's reader thread, with a `BLOCK` overflow policy 
+        a slow callback stalls the whole connection, responses to requests included. 
+        with `batch_size` and / or `max_delay` set, `callback` is handed a list of notifications once either limit is reached.
+        `idle_timeout` is kept for compatibility, subscriptions share the request stream and its idle timeout'''
+        if not self._is_subscription_request(command):
+            raise CommandIsNotSubcribable(self.node, command)
+        self._verify_connection(command)
+        if batch_size or max_delay:
+            dispatcher = BatchingDispatcher(batch_size, max_delay, dispatcher, overflow=DROP_OLDEST) # never hold back the reader
+        if command in self._subscriptions: # replace the local handler, the node keeps the existing subscription
+            self.request_stream.detach(command, stop=False)
+        self._subscriptions[command] = Subscription(command, payload, callback, raw=self._use_raw(raw), dispatcher=dispatcher)
+        LOG.info(cli_lm.MSG_SENDING(command, self.node))
+        resp = self.unwrap_response(self.request_stream.wait(self.request_stream.attach(self._subscriptions[command]), timeout, raw=True))
+        if resp.error.message:
+            self.request_stream.detach(command, stop=False)
+            del self._subscriptions[command]
+            raise RPCResponseException(self.node, command, resp.error.message)
     
     def unsubscribe(self, command: str) -> None:
-        self._subscriptions[command].close()
+        '''detaches the local handler, and asks the node to stop notifying where kaspad supports it'''
+        if command not in self._subscriptions:
+            raise SubscriptionCannotBeUnsubscribed(self.node, command)
+        self.request_stream.detach(command)
         del self._subscriptions[command]
     
+    def stream(self, command: str, payload: Union[dict, str, None] = None, maxsize: int = 1024, raw: Union[bool, None] = None) -> NotificationStream:
+        '''returns an iterator, and async iterator, over the notifications of `command`.
+        
+        it reads from its own message stream on the client's channel, and stops reading while `maxsize` notifications wait to be consumed'''
+        if not self._is_subscription_request(command):
+            raise CommandIsNotSubcribable(self.node, command)
+        self._verify_connection(command)
+        notifications = NotificationStream(self.node, command, payload, self._get_service_stub(), channel=self.request_stream._conn, 
+                                           maxsize=maxsize, raw=self._use_raw(raw))
+        notifications.metrics = self.metrics
+        notifications.on_close = self._forget_stream
+        self._notification_streams.append(notifications)
+        notifications.start()
+        return notifications
+    
+    def _forget_stream(self, notifications: NotificationStream):
+        try:
+            self._notification_streams.remove(notifications)
+        except ValueError: # already forgotten by `close_all_streams`
+            pass
+    
     def close_all_streams(self):
-        for sub in self._subscriptions.values():
-            sub.close()
-        self._subscriptions = defaultdict(dict)
+        for command in tuple(self._subscriptions):
+            self.request_stream.detach(command, stop=False)
+        self._subscriptions = {}
+        for notifications in tuple(self._notification_streams):
+            notifications.close()
+        self._notification_streams = []
+    
+    # metrics
+    
+    def enable_metrics(self, metrics: Union[ClientMetrics, None] = None) -> ClientMetrics:
+        '''records per command histograms and notification rates into `metrics`, a new `ClientMetrics` if not given'''
+        self.metrics = metrics if metrics is not None else ClientMetrics()
+        for stream in chain([self.request_stream], tuple(self._notification_streams)):
+            if not isinstance(stream, type):
+                stream.metrics = self.metrics
+        return self.metrics
+    
+    def disable_metrics(self) -> None:
+        self.metrics = None
+        for stream in chain([self.request_stream], tuple(self._notification_streams)):
+            if not isinstance(stream, type):
+                stream.metrics = None
+    
+    def _queue_depths(self) -> Dict[str, Any]:
+        stream = self.request_stream
+        if isinstance(stream, type): # not connected
+            return {}
+        depths = {'inputs': stream._inputs.qsize()}
+        if isinstance(stream, RequestStream):
+            depths['in_flight'] = stream.in_flight
+            depths['subscriptions'] = {command: subscription.queue_depth for command, subscription in self._subscriptions.items()}
+        depths['outputs'] = stream._outputs.qsize()
+        depths['notification_streams'] = {notifications.subscription[0]: notifications.queue_depth for notifications in tuple(self._notification_streams)}
+        return depths
+    
+    def stats(self) -> Dict[str, Any]:
+        '''a snapshot of the live queue depths, and with metrics enabled, of the histograms and notification rates.
+        
+        render it with `kaspy.metrics.prometheus_text` for a Prometheus scrape'''
+        stats = {'node': str(self.node) if isinstance(self.node, Node) else None, 'queues': self._queue_depths()}
+        if self.metrics is not None:
+            stats.update(self.metrics.snapshot())
+        return stats
     
     # checks
+    
+    def _verify_health(self, command : str) -> None:
+        if self.health is None:
+            return None
+        breaker = self.health.breaker(self.node)
+        if not breaker.allow():
+            raise CircuitOpen(self.node, command, breaker.reason)
+    
+    def _record_health(self, ok: bool, latency: Union[float, None] = None) -> None:
+        if self.health is not None:
+            self.health.record(self.node, ok, latency)
+    
     def _is_subscription_request(self, command: str):
         return command.startswith('notify')
     
@@ -155,9 +277,19 @@ class BaseClient(_KaspaClient):
     
     # helpers
     
-    def _get_message_name(self, serialized_msg : dict):
+    def _get_message_name(self, serialized_msg : Union[dict, KaspadMessage]):
+        if isinstance(serialized_msg, KaspadMessage):
+            return serialized_msg.WhichOneof('payload')
         return next(iter(serialized_msg.keys()))
     
+    def _use_raw(self, raw: Union[bool, None]) -> bool:
+        return self.raw if raw is None else raw
+    
+    @staticmethod
+    def unwrap_response(response: KaspadMessage):
+        '''returns the oneof payload message of a raw `KaspadMessage` i.e. the `GetInfoResponseMessage` of a `getInfoResponse`'''
+        return getattr(response, response.WhichOneof('payload'))
+    
     def _get_service_stub(self):
         return RPCStub if self.service == RPC_SERVICE else P2PStub
     
@@ -168,18 +300,59 @@ class BaseClient(_KaspaClient):
         LOG.info(cli_lm.MSG_SENDING(command, self.node))
         self.request_stream.put((command, payload))
     
-    def recv(self, timeout: Union[float, int, None] = 2) -> Iterator[Union[dict, str]]:
+    def recv(self, timeout: Union[float, int, None] = 2, raw: Union[bool, None] = None) -> Union[dict, KaspadMessage]:
         try:
-            return self.request_stream.get(timeout)
+            return self.request_stream.get(timeout, raw=self._use_raw(raw))
         except grpc.RpcError as e:
-            self._response_error_handler(str(e.code()), e.details())
+            self._response_error_handler(e.code().name, e.details())
         except TimeoutError as te:
             self._retry_connection(te)
             
     
-    def request(self, command : str, payload: Union[dict, str, None] = None, timeout: Union[float, int, None] = None) -> Union[dict, str]:
-        self.send(command, payload)
-        resp = self.recv(timeout)
+    def request(self, command : str, payload: Union[dict, str, None] = None, timeout: Union[float, int, None] = None, 
+                raw: Union[bool, None] = None) -> Union[dict, KaspadMessage]:
+        '''sends a request and waits for its response, safe to call from many threads over the same stream
+        
+        requests in `SPLITTABLE_COMMANDS` are split over their list when the response would exceed max_receive_size. 
+        when watched by a `HealthMonitor`, requests to a node with an open circuit breaker raise `CircuitOpen`. 
+        with a `response_cache` set, cached responses are returned without a round trip, 
+        with a `block_store` set, blocks it holds are served from it'''
+        self._verify_connection(command)
+        if self.block_store is not None and command in ('getBlockRequest', 'getBlocksRequest'):
+            return self.request_stream._serialize_output(self._request_blocks(command, payload, timeout), self._use_raw(raw))
+        return self._request(command, payload, timeout, raw)
+    
+    def _request(self, command : str, payload: Union[dict, str, None], timeout: Union[float, int, None], 
+                 raw: Union[bool, None], retried: bool = False) -> Union[dict, KaspadMessage]:
+        connection = self._connections
+        cache_key = self.response_cache.key(self.node, command, payload) if self.response_cache is not None else None
+        if cache_key is not None:
+            resp = self.response_cache.get(cache_key)
+            if resp is not None:
+                return self.request_stream._serialize_output(resp, self._use_raw(raw))
+        self._verify_health(command)
+        LOG.info(cli_lm.MSG_SENDING(command, self.node))
+        start = time.perf_counter()
+        try:
+            if self._is_splittable(command, payload):
+                resp = self.request_stream._serialize_output(self._request_split(command, payload, timeout), self._use_raw(raw))
+            elif cache_key is not None:
+                resp = self.request_stream.wait(self.request_stream.submit(command, payload), timeout, raw=True)
+                self.response_cache.put(cache_key, resp)
+                resp = self.request_stream._serialize_output(resp, self._use_raw(raw))
+            else:
+                resp = self.request_stream.wait(self.request_stream.submit(command, payload), timeout, raw=self._use_raw(raw))
+        except grpc.RpcError as e:
+            self._record_health(e.code().name not in ('RESOURCE_EXHAUSTED', 'CANCELLED')) # neither is the node's fault
+            self._response_error_handler(e.code().name, e.details(), retry=not retried, connection=connection) # raises, unless it reconnected
+            return self._request(command, payload, timeout, raw, retried=True)
+        except TimeoutError as te:
+            self._record_health(False)
+            if retried:
+                raise te
+            self._retry_connection(te, connection=connection) # raises, unless it reconnected
+            return self._request(command, payload, timeout, raw, retried=True)
+        self._record_health(True, time.perf_counter() - start)
         LOG.info(cli_lm.MSG_RECIVED(
             self._get_message_name(resp),
             command,
@@ -187,6 +360,127 @@ class BaseClient(_KaspaClient):
                     ))
         return resp
         
+    def _request_blocks(self, command : str, payload: Union[dict, str, None], timeout: Union[float, int, None]) -> KaspadMessage:
+        '''serves `getBlockRequest` from the block store, and fetches only the blocks of a `getBlocksRequest` page it does not hold, 
+        if it holds at least `BLOCK_STORE_MIN_HELD` of them. fetched blocks are stored'''
+        request = COMMANDS[command].build(payload)
+        if isinstance(request, bytes): # no payload, nothing to look up
+            return self._request(command, payload, timeout, raw=True)
+        if command == 'getBlockRequest':
+            message = request.getBlockRequest
+            block = self.block_store.get(message.hash, message.includeTransactions)
+            if block is not None:
+                resp = KaspadMessage()
+                resp.getBlockResponse.block.CopyFrom(block)
+                return resp
+            resp = self._request(command, message, timeout, raw=True)
+            if resp is not None and not resp.getBlockResponse.error.message:
+                self.block_store.put(resp.getBlockResponse.block, message.hash, message.includeTransactions)
+            return resp
+        message = request.getBlocksRequest
+        if not message.includeBlocks:
+            return self._request(command, message, timeout, raw=True)
+        page = self._request(command, {'lowHash': message.lowHash, 'includeBlocks': False}, timeout, raw=True)
+        if page is None or page.getBlocksResponse.error.message:
+            return page
+        hashes = list(page.getBlocksResponse.blockHashes)
+        missing = [block_hash for block_hash in hashes if not self.block_store.has(block_hash, message.includeTransactions)]
+        if len(missing) <= len(hashes) * (1 - BLOCK_STORE_MIN_HELD): # taken now, storing the fetched blocks may evict them from a small store
+            held = {block_hash: self.block_store.get(block_hash, message.includeTransactions) for block_hash in hashes if block_hash not in missing}
+            if None in held.values(): # evicted meanwhile by another request
+                missing = hashes
+        if len(missing) > len(hashes) * (1 - BLOCK_STORE_MIN_HELD): # cheaper to fetch the whole page at once
+            resp = self._request(command, message, timeout, raw=True)
+            if resp is not None and not resp.getBlocksResponse.error.message:
+                for block_hash, block in zip(resp.getBlocksResponse.blockHashes, resp.getBlocksResponse.blocks):
+                    self.block_store.put(block, block.verboseData.hash or block_hash, message.includeTransactions)
+            return resp
+        requests = (('getBlockRequest', {'hash': block_hash, 'includeTransactions': message.includeTransactions}) for block_hash in missing)
+        for index, resp in self.request_many(requests, timeout=timeout, raw=True):
+            if isinstance(resp, Exception):
+                raise resp
+            if resp.getBlockResponse.error.message:
+                raise RPCResponseException(self.node, command, resp.getBlockResponse.error.message)
+            held[missing[index]] = resp.getBlockResponse.block
+            self.block_store.put(resp.getBlockResponse.block, missing[index], message.includeTransactions)
+        resp = KaspadMessage()
+        resp.getBlocksResponse.blockHashes.extend(hashes)
+        for block_hash in hashes:
+            resp.getBlocksResponse.blocks.add().CopyFrom(held[block_hash])
+        return resp
+    
+    def _is_splittable(self, command : str, payload: Union[dict, str, None]) -> bool:
+        return command in SPLITTABLE_COMMANDS and isinstance(payload, dict) and len(payload.get(SPLITTABLE_COMMANDS[command]) or ()) > 1
+    
+    def _request_split(self, command : str, payload: dict, timeout: Union[float, int, None]) -> KaspadMessage:
+        '''requests the payload list in chunks known to fit, and merges the responses'''
+        field = SPLITTABLE_COMMANDS[command]
+        items = list(payload[field])
+        size = self._chunk_sizes.get(command, len(items))
+        merged = KaspadMessage()
+        for start in range(0, len(items), size):
+            merged.MergeFrom(self._request_chunk(command, payload, field, items[start:start+size], timeout))
+        return merged
+    
+    def _request_chunk(self, command : str, payload: dict, field: str, items: list, timeout: Union[float, int, None]) -> KaspadMessage:
+        try:
+            return self.request_stream.wait(self.request_stream.submit(command, {**payload, field: items}), timeout, raw=True)
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.RESOURCE_EXHAUSTED or len(items) < 2:
+                raise e
+        half = (len(items) + 1) // 2 # the response did not fit, split in halves and remember the smaller size for next time
+        self._chunk_sizes[command] = min(half, self._chunk_sizes.get(command, half))
+        LOG.info(cli_lm.MSG_SPLITTING(command, len(items), self.node))
+        resp = self._request_chunk(command, payload, field, items[:half], timeout)
+        resp.MergeFrom(self._request_chunk(command, payload, field, items[half:], timeout))
+        return resp
+    
+    def request_many(self, requests: Iterable[Tuple[str, Union[dict, str, None]]], window: int = 16, timeout: Union[float, int, None] = None,
+                     ordered: bool = True, raw: Union[bool, None] = None) -> Iterator[Tuple[int, Union[dict, KaspadMessage, Exception]]]:
+        '''pipelines `(command, payload)` requests, keeping up to `window` of them in flight on the stream.
+        
+        yields `(index, response)` in request order, or as they complete if not `ordered`. 
+        a failed request yields its exception in place of the response, `timeout` applies to each wait.'''
+        self._verify_connection('request_many')
+        raw = self._use_raw(raw)
+        if ordered:
+            pending = deque()
+            for index, (command, payload) in enumerate(requests):
+                pending.append((index, self._submit_nowait(command, payload)))
+                if len(pending) >= window:
+                    yield self._collect(*pending.popleft(), timeout, raw)
+            while pending:
+                yield self._collect(*pending.popleft(), timeout, raw)
+        else:
+            pending = {}
+            for index, (command, payload) in enumerate(requests):
+                pending[self._submit_nowait(command, payload)] = index
+                while len(pending) >= window:
+                    yield from self._collect_completed(pending, timeout, raw)
+            while pending:
+                yield from self._collect_completed(pending, timeout, raw)
+    
+    def _submit_nowait(self, command : str, payload: Union[dict, str, None]) -> Future:
+        try:
+            return self.request_stream.submit(command, payload)
+        except Exception as e: # i.e. InvalidCommand, reported with the item
+            future = Future()
+            future.set_exception(e)
+            return future
+    
+    def _collect(self, index: int, future: Future, timeout: Union[float, int, None], raw: bool) -> Tuple[int, Union[dict, KaspadMessage, Exception]]:
+        try:
+            return index, self.request_stream.wait(future, timeout, raw=raw)
+        except Exception as e:
+            return index, e
+    
+    def _collect_completed(self, pending: Dict[Future, int], timeout: Union[float, int, None], raw: bool) -> Iterator[Tuple[int, Union[dict, KaspadMessage, Exception]]]:
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done: # nothing came back in time, give up on what is in flight
+            done = tuple(pending)
+        for future in done:
+            yield self._collect(pending.pop(future), future, 0, raw)
+    
     # some funcs to query for server info
     
     def kaspa_open_services(self):
@@ -200,34 +494,43 @@ class BaseClient(_KaspaClient):
         return self.node.latency(timeout)
     
     # Error handling:
-    def _retry_connection(self, err, counter = 0):
-        if counter == self._retry_count:
-            if self.restablish_new_connection:
-                self.auto_connect(*self._auto_conn_params) #save input from last auto_connect call
-            raise err
-        time.sleep(self._retry_wait)
-        self.connect(self.node.ip, self.node.port)
-        try:
-            self.request('getInfoRequest') # test the connection
-        except Exception as e:
-            LOG.debug(e)
-            self._retry_connection(err, counter=counter+1)
+    def _retry_connection(self, err, counter = 0, connection: Union[int, None] = None):
+        '''reconnects, up to `retry_count` times. of the callers which failed on the same `connection`, only the first one 
+        reconnects, the others wait for it and return, to re-issue their request on the new connection'''
+        with self._reconnect_lock:
+            if connection is not None and connection != self._connections:
+                return None
+            if counter == self._retry_count:
+                if self.restablish_new_connection:
+                    self.auto_connect(*self._auto_conn_params) #save input from last auto_connect call
+                raise err
+            time.sleep(self._retry_wait)
+            if HOOKS.reconnect:
+                HOOKS.fire(HOOKS.reconnect, self.node, f'retry {counter + 1} after {type(err).__name__}')
+            self.connect(self.node.ip, self.node.port, retry_count=self._retry_count, retry_wait=self._retry_wait, **self._stream_params)
+            try: # test the connection, straight on the stream, a cached response would not
+                self.request_stream.wait(self.request_stream.submit('getInfoRequest'), RECONNECT_CHECK_TIMEOUT, raw=True)
+            except Exception as e:
+                LOG.debug(e)
+                self._retry_connection(err, counter=counter+1)
 
-    def _response_error_handler(self, code : str, details : str):
+    def _response_error_handler(self, code : str, details : str, retry: bool = True, connection: Union[int, None] = None):
         #for now raise until we have proper error handling. 
         if code == 'UNAVAILABLE': #only real exception I am catching during testing, I doubt there is anything we can do on the client side. 
             err = RPCServiceUnavailable(self.node, code, details)
-            if self._retry_count:
+            if self._retry_count and retry:
                 LOG.debug(err)
-                self._retry_connection(err)
+                self._retry_connection(err, connection=connection)
             else:
                 raise err
+        elif code == 'RESOURCE_EXHAUSTED': # response exceeded max_receive_size, the stream reopens itself, reconnecting won't help
+            raise RPCResponseException(self.node, code, details)
         #will add error handling as issues arise - for now I will leave it as is.
         else:
             err = RPCResponseException(self.node, code, details)
-            if self._retry_count:
+            if self._retry_count and retry:
                 LOG.debug(err)
-                self._retry_connection(err)
+                self._retry_connection(err, connection=connection)
             raise err
     
     def _requests_error_handler(self, command : str, payload : dict):
@@ -250,61 +553,380 @@ class RPCClient(BaseClient):
     def kaspad_version(self, timeout) -> ver:
         '''Query the kaspad version the host is running''' 
         if str(self.node.version) == UNKNOWEN:
-            self.node.version = ver.parse_from_string(self.request('getInfoRequest', timeout=timeout)['getInfoResponse']['serverVersion'])
+            self.node.version = ver.parse_from_string(self.request('getInfoRequest', timeout=timeout, raw=False)['getInfoResponse']['serverVersion'])
         return self.node.version
         
     def kaspad_network(self, timeout) -> str:
         '''Querx the kaspad network the host is running'''
         if str(self.node.network) == UNKNOWEN:
-            self.node.network = self.request('getCurrentNetworkRequest', timeout=timeout)['getCurrentNetworkResponse']['currentNetwork'].lower()
+            self.node.network = self.request('getCurrentNetworkRequest', timeout=timeout, raw=False)['getCurrentNetworkResponse']['currentNetwork'].lower()
         return self.node.network
     
     def kaspad_utxoindex(self, timeout):
         try:
-                return self.request('getInfoRequest', {})['getInfoResponse']['isUtxoIndexed']
+                return self.request('getInfoRequest', {}, timeout=timeout, raw=False)['getInfoResponse']['isUtxoIndexed']
         except:
-                return false
+                return False
+    
+    def _describe_node(self, timeout):
+        '''fills in the version, utxoindex flag and network of the node, for the node cache'''
+        info = self.request('getInfoRequest', timeout=timeout, raw=False)['getInfoResponse']
+        self.node.version = ver.parse_from_string(info['serverVersion'])
+        self.node.utxoindex = info.get('isUtxoIndexed', False)
+        self.kaspad_network(timeout)
+    
+    @staticmethod
+    def _open_node_cache(node_cache: Union[NodeCache, str, bool, None]) -> Union[NodeCache, None]:
+        if isinstance(node_cache, NodeCache):
+            return node_cache
+        if isinstance(node_cache, str):
+            return NodeCache.open(node_cache)
+        return NodeCache.open(NODE_CACHE_PATH) if node_cache else None
+    
+    @staticmethod
+    def _refresh_node_cache(cache: NodeCache, port: Union[int, str], timeout: Union[float, None], 
+                            count: int = NODE_CACHE_REFRESH_COUNT) -> Union[threading.Thread, None]:
+        '''looks up `count` nodes from one scan of the dns seeds in a background thread, once per cache'''
+        if cache.refreshed:
+            return None
+        cache.refreshed = True
+        def refresh():
+            found = 0
+            for node in node_acquirer.yield_open_nodes(port = port, passes = 1):
+                client = RPCClient()
+                try:
+                    client.connect(node.ip, port)
+                    client.node.last_latency = node.last_latency
+                    client._describe_node(timeout)
+                    cache.record_success(client.node)
+                    found += 1
+                except Exception as e:
+                    LOG.debug(e)
+                finally:
+                    client.close()
+                if found >= count:
+                    break
+        thread = threading.Thread(target=refresh, daemon=True)
+        thread.start()
+        return thread
 
     def auto_connect(self, min_kaspad_version: Union[ver, str, None] = None, subnetwork: Union[str, None] = MAINNET,
                     conn_timeout: Union[float, None] = 3, idel_timeout: float = None, max_latency: Union[float, None] =  None, 
-                    retry_count = None, retry_wait = None, new_conn_on_err: bool = False, utxoindex: bool = False, max_receive_size=(1024**2)*4) -> None:
-        '''auto connect to a RPC node'''
+                    retry_count = None, retry_wait = None, new_conn_on_err: bool = False, utxoindex: bool = False, max_receive_size=(1024**2)*4,
+                    node_cache: Union[NodeCache, str, bool, None] = True, race: int = 1, rank: Union[int, None] = None) -> Union[List[Node], None]:
+        '''auto connect to a RPC node
+        
+        with `node_cache` (a `NodeCache`, a path, or True for the default path) nodes which answered before are tried first, 
+        best ranked first, before scanning the dns seeds. the cache is refreshed from the dns seeds in the background.
+        
+        with `race` > 1, that many candidates are checked at once, and the client connects to the first one to pass all checks. 
+        with `rank` set, up to `rank` qualified nodes are collected (for at most `conn_timeout` after the first one), the client 
+        connects to the one with the lowest latency, and the qualified nodes are returned by latency for failover'''
         if new_conn_on_err:
             self._auto_conn_params = tuple(locals().values(),)[1:] # for possible later use in self._retry_connection
+        if isinstance(min_kaspad_version, str): 
+            min_kaspad_version = ver.parse_from_string(min_kaspad_version)
         port = RPC_DEF_PORTS[subnetwork]
         self.restablish_new_connection = new_conn_on_err
-        for node in node_acquirer.yield_open_nodes(port = port):
-            self.connect(node.ip, port, idel_timeout, retry_count, retry_wait, max_receive_size=max_receive_size)
-            latency = self.kaspad_check_port(min(filter(bool, [conn_timeout, max_latency]), default=None))
-            if not latency:
-                self.close()
-                continue
-            if latency:
-                if max_latency:
-                    if latency > max_latency:
-                        self.close()
-                        continue
+        cache = self._open_node_cache(node_cache)
+        nodes = node_acquirer.yield_open_nodes(port = port)
+        if cache is not None:
+            self._refresh_node_cache(cache, port, conn_timeout)
+            nodes = chain(cache.yield_open_nodes(port, subnetwork, utxoindex, min_kaspad_version, conn_timeout or 3), nodes)
+        checks = dict(port=port, min_kaspad_version=min_kaspad_version, subnetwork=subnetwork, conn_timeout=conn_timeout, 
+                      idel_timeout=idel_timeout, max_latency=max_latency, retry_count=retry_count, retry_wait=retry_wait, 
+                      utxoindex=utxoindex, max_receive_size=max_receive_size, cache=cache)
+        if race > 1 or rank:
+            return self._race_connect(nodes, max(race, 1), rank, checks)
+        for node in nodes:
+            if self._qualify(node, **checks):
+                if HOOKS.node_selected:
+                    HOOKS.fire(HOOKS.node_selected, self.node, 'auto_connect')
+                break
+    
+    def _qualify(self, node: Node, port: Union[int, str], min_kaspad_version: Union[ver, None], subnetwork: Union[str, None], 
+                 conn_timeout: Union[float, None], idel_timeout: Union[float, None], max_latency: Union[float, None], retry_count, retry_wait, 
+                 utxoindex: bool, max_receive_size: int, cache: Union[NodeCache, None]) -> bool:
+        '''connects to `node` and runs the checks of `auto_connect`, closes the client again if one fails'''
+        self.connect(node.ip, port, idel_timeout, retry_count, retry_wait, max_receive_size=max_receive_size)
+        latency = node.last_latency if node.last_latency else self.kaspad_check_port(min(filter(bool, [conn_timeout, max_latency]), default=None))
+        self.node.last_latency = latency
+        if not latency:
+            self.close()
+            return False
+        if latency:
+            if max_latency:
+                if latency > max_latency:
+                    self.close()
+                    return False
+        try:
+            if utxoindex == True:
+                if not self.kaspad_utxoindex(conn_timeout):
+                    self.close()
+                    return False
+            if subnetwork:
+                if self.kaspad_network(conn_timeout) != subnetwork:
+                    self.close()
+                    return False
+            if min_kaspad_version:
+                if self.kaspad_version(conn_timeout) < min_kaspad_version:
+                    self.close()
+                    return False
+            if cache is not None:
+                self._describe_node(conn_timeout)
+                cache.record_success(self.node)
+        except (RPCServiceUnavailable, RPCResponseException, TimeoutError) as e:
+            LOG.debug(e)
+            if cache is not None:
+                cache.record_failure(self.node)
+            self.close()
+            return False
+        return True
+    
+    def _race_connect(self, nodes: Iterator[Node], race: int, rank: Union[int, None], checks: dict) -> Union[List[Node], None]:
+        '''runs `_qualify` for `race` candidates at once, each on a client of its own, and takes over the connection of the best.
+        
+        candidates are drawn from `nodes` in a feeder thread, so a slow node discovery never holds back the candidates being checked'''
+        pool = ThreadPoolExecutor(race)
+        slots = threading.Semaphore(race)
+        results = SimpleQueue()
+        lock = threading.Lock()
+        settled = threading.Event()
+        
+        def qualify(node: Node) -> Union['RPCClient', None]:
+            candidate = RPCClient()
+            return candidate if candidate._qualify(node, **checks) else None
+        
+        def collect(future: Future):
+            slots.release()
+            candidate = None if future.cancelled() or future.exception() else future.result()
+            with lock:
+                if not settled.is_set():
+                    results.put(candidate)
+                    return None
+            if candidate: # checked after the race was decided
+                candidate.close()
+        
+        def feed():
+            submitted = []
+            for node in nodes:
+                slots.acquire()
+                if settled.is_set():
+                    break
+                submitted.append(pool.submit(qualify, node))
+                submitted[-1].add_done_callback(collect)
+            else:
+                wait(submitted)
+                results.put(StopIteration) # ran out of candidates
+        
+        threading.Thread(target=feed, daemon=True).start()
+        qualified = []
+        deadline = None
+        while True:
             try:
-                if utxoindex == True:
-                    if not self.kaspad_utxoindex(conn_timeout):
-                        self.close()
-                        continue
-                if subnetwork:
-                    if self.kaspad_network(conn_timeout) != subnetwork:
-                        self.close()
-                        continue
-                if min_kaspad_version:
-                    if isinstance(min_kaspad_version, str): 
-                        min_kaspad_version = ver.parse_from_string(min_kaspad_version)
-                    if self.kaspad_version(conn_timeout) < min_kaspad_version:
-                        self.close()
-                        continue
-            except (RPCServiceUnavailable, TimeoutError) as e:
-                LOG.debug(e)
-                self.close()
+                candidate = results.get(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+            except Empty:
+                break
+            if candidate is StopIteration:
+                break
+            if candidate is None:
                 continue
-            break
+            qualified.append(candidate)
+            if not rank or len(qualified) >= rank:
+                break
+            if deadline is None:
+                deadline = time.monotonic() + (checks['conn_timeout'] or 0)
+        with lock:
+            settled.set()
+        slots.release() # let the feeder see the race is decided
+        pool.shutdown(wait=False)
+        while not results.empty():
+            candidate = results.get()
+            if candidate not in (None, StopIteration):
+                candidate.close()
+        if not qualified:
+            return None
+        qualified.sort(key=lambda candidate: candidate.node.last_latency)
+        for candidate in qualified[1:]:
+            candidate.close()
+        self._adopt(qualified[0])
+        LOG.info(cli_lm.CONN_RACE_WON(self.node, len(qualified)))
+        if HOOKS.node_selected:
+            HOOKS.fire(HOOKS.node_selected, self.node, 'auto_connect race')
+        if rank:
+            return [candidate.node for candidate in qualified]
+    
+    def _adopt(self, client: 'RPCClient'):
+        '''takes over the connection of `client`'''
+        self.node = client.node
+        self.request_stream = client.request_stream
+        self.request_stream.metrics = self.metrics
+        self.client_status = client.client_status
+        self._retry_count = client._retry_count
+        self._retry_wait = client._retry_wait
         
+class RPCClientPool(_KaspaClient):
+    
+    def __init__(self, size: int = 4, nodes: Union[Iterable[Union[Node, str]], None] = None, idle_timeout: Union[float, int, None] = None, 
+                 max_receive_size = (1024**2)*4, check_interval: float = 5, routing: str = LEAST_LOADED, latency_alpha: float = 0.2, 
+                 explore: float = 0.05, health: Union[HealthMonitor, None] = None, response_cache: Union[ResponseCache, None] = None, 
+                 block_store: Union[BlockStore, None] = None, metrics: Union[ClientMetrics, None] = None, **auto_connect_kwargs) -> None:
+        '''a pool of `size` RPC clients, each on its own channel, with the `request`, `send`, `recv` and `subscribe` of a `RPCClient`.
+        
+        members connect round robin to `nodes` ("ip:port"), or with `RPCClient.auto_connect(**auto_connect_kwargs)` if no nodes are given. 
+        dead members are replaced in the background. with `routing=LEAST_LOADED` requests go to the member with the fewest outstanding requests, 
+        with `routing=LOWEST_LATENCY` to the member with the lowest moving average of round trip times (smoothed by `latency_alpha`), 
+        a share of `explore` requests goes to a random member so degraded nodes are re-measured. 
+        with a `health` monitor, members are watched by it, and members whose node has an open circuit breaker are skipped. 
+        a `response_cache`, a `block_store` and `metrics` are shared by all members.'''
+        self.size = size
+        self.routing = routing
+        self._latency_alpha = latency_alpha
+        self._explore = explore
+        self._latencies = {} # member -> moving average of request round trip times
+        self.nodes = [node if isinstance(node, Node) else Node(*node.rsplit(':', 1)) for node in nodes] if nodes else []
+        self.raw = False
+        self._idle_timeout = idle_timeout
+        self._max_receive_size = max_receive_size
+        self._auto_conn_params = auto_connect_kwargs
+        self._next_node = 0
+        self._lock = threading.Lock()
+        self._sent = deque() # members in the order of `send`, for `recv`
+        self._subscriptions = {} # command -> subscribe kwargs, renewed on a replaced primary member
+        self.health = health
+        self.response_cache = response_cache
+        self.block_store = block_store
+        self.metrics = metrics
+        self.members = [self._new_member() for _ in range(size)]
+        self.client_status = CONNECTED
+        self._check_interval = check_interval
+        threading.Thread(target=self._maintain, daemon=True).start()
+    
+    # members
+    
+    def _new_member(self) -> RPCClient:
+        member = RPCClient()
+        if not self.nodes:
+            member.auto_connect(idel_timeout=self._idle_timeout, max_receive_size=self._max_receive_size, **self._auto_conn_params)
+        else:
+            with self._lock:
+                node = self.nodes[self._next_node % len(self.nodes)]
+                self._next_node += 1
+            member.connect(node.ip, node.port, self._idle_timeout, max_receive_size=self._max_receive_size)
+        if self.health:
+            self.health.watch(member)
+        member.response_cache = self.response_cache
+        member.block_store = self.block_store
+        if self.metrics is not None:
+            member.enable_metrics(self.metrics)
+        return member
+    
+    def _alive(self, member: RPCClient) -> bool:
+        return isinstance(member.request_stream, RequestStream) and member.request_stream.is_alive()
+    
+    def _healthy(self, member: RPCClient) -> bool:
+        return self.health is None or self.health.breaker(member.node).available
+    
+    def _pick(self) -> RPCClient:
+        members = [member for member in self.members if self._alive(member) and self._healthy(member)] or self.members
+        if self.routing == LOWEST_LATENCY:
+            if len(members) > 1 and random.random() < self._explore:
+                member, reason = random.choice(members), 'pool explore'
+            else:
+                member = min(members, key=lambda member: self._latencies.get(member, 0.0) * (member.request_stream.in_flight + 1))
+                reason = 'pool lowest latency'
+        else:
+            member, reason = min(members, key=lambda member: member.request_stream.in_flight), 'pool least loaded'
+        if HOOKS.node_selected:
+            HOOKS.fire(HOOKS.node_selected, member.node, reason)
+        return member
+    
+    def _observe(self, member: RPCClient, latency: float):
+        last = self._latencies.get(member)
+        self._latencies[member] = latency if last is None else last + self._latency_alpha * (latency - last)
+    
+    @property
+    def latencies(self) -> Dict[str, float]:
+        '''moving average of request round trip times per member node, in seconds'''
+        return {str(member.node): self._latencies[member] for member in self.members if member in self._latencies}
+    
+    def _maintain(self):
+        while self.client_status != CLOSED:
+            time.sleep(self._check_interval)
+            for index, member in enumerate(self.members):
+                if self.client_status == CLOSED or self._alive(member):
+                    continue
+                try:
+                    self._replace(index, member)
+                except Exception as e:
+                    LOG.debug(e)
+    
+    def _replace(self, index: int, member: RPCClient):
+        LOG.info(cli_lm.POOL_MEMBER_REPLACING(member.node))
+        member.request_stream.close() # leaves the subscription dispatchers open for the replacement
+        if self.health:
+            self.health.unwatch(member)
+        self._latencies.pop(member, None)
+        replacement = self._new_member()
+        if index == 0: # the primary member holds the subscriptions
+            for command, kwargs in self._subscriptions.items():
+                replacement.subscribe(command, **kwargs)
+        self.members[index] = replacement
+    
+    @property
+    def in_flight(self) -> int:
+        return sum(member.request_stream.in_flight for member in self.members if isinstance(member.request_stream, RequestStream))
+    
+    def stats(self) -> Dict[str, Any]:
+        '''the queue depths of each member, and the shared metrics'''
+        stats = {'members': [{'node': str(member.node), 'queues': member._queue_depths()} for member in self.members]}
+        if self.metrics is not None:
+            stats.update(self.metrics.snapshot())
+        return stats
+    
+    # standard interactions
+    
+    def request(self, command : str, payload: Union[dict, str, None] = None, timeout: Union[float, int, None] = None, 
+                raw: Union[bool, None] = None) -> Union[dict, KaspadMessage]:
+        member = self._pick()
+        start = time.perf_counter()
+        try:
+            resp = member.request(command, payload, timeout, raw=self.raw if raw is None else raw)
+        except Exception:
+            elapsed = time.perf_counter() - start # failures count as twice as slow, to demote the node
+            self._observe(member, max(elapsed, 2 * self._latencies.get(member, elapsed)))
+            raise
+        self._observe(member, time.perf_counter() - start)
+        return resp
+    
+    def send(self, command : str, payload : Union[dict, str, None] = None) -> None:
+        with self._lock:
+            member = self._pick()
+            member.send(command, payload)
+            self._sent.append(member)
+    
+    def recv(self, timeout: Union[float, int, None] = 2, raw: Union[bool, None] = None) -> Union[dict, KaspadMessage]:
+        with self._lock:
+            member = self._sent.popleft() if self._sent else self.members[0]
+        return member.recv(timeout, raw=self.raw if raw is None else raw)
+    
+    def subscribe(self, command: str, callback: Callable[[Union[dict, KaspadMessage]], Any], payload: Union[dict, str, None] = None, **kwargs) -> None:
+        '''subscribes on the primary member, and again on its replacement'''
+        kwargs = dict(callback=callback, payload=payload, raw=kwargs.pop('raw', self.raw), **kwargs)
+        self.members[0].subscribe(command, **kwargs)
+        self._subscriptions[command] = kwargs
+    
+    def unsubscribe(self, command: str) -> None:
+        self._subscriptions.pop(command, None)
+        self.members[0].unsubscribe(command)
+    
+    def close(self) -> None:
+        self.client_status = CLOSED
+        for member in self.members:
+            if self.health:
+                self.health.unwatch(member)
+            member.close()
+
 class P2PClient(BaseClient):
     '''
     still need to read up on p2p message docs if i were to find them, or read through the kaspad codebase
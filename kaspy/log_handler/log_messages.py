@@ -28,6 +28,8 @@ class network:
     CHECK_LATENCY_STAUTS_NONE = lambda node: f'''[{node}]: no connection estblished to check latency'''
     CHECK_LATENCY_STATUS_DELAY = lambda node, latency: f'''[{node}]: latency measured at {int(round(latency*1000, 0))} ms'''
     
+    NODE_UNHEALTHY = lambda node, reason : f'''[{node}]: node is unhealthy, {reason} {ABORT}'''
+    
     PORT_QUERY =  lambda node: f'''[{node}]: querying if port is open...'''
     CHECK_PORT_STAUTS_OPEN = lambda node, port : f'''[{node}]: port {port} is OPEN {SUCCESS}'''
     CHECK_PORT_STAUTS_CLOSED = lambda node, port : f'''[{node}]: port {port} is CLOSED {ABORT}'''
@@ -43,9 +45,12 @@ class client:
     CONN_ESTABLISHED = lambda node : f'''[{node}]: Connection established'''
     CONN_DISCONNECTING = NotImplemented
     CONN_DISCONNECTED = NotImplemented
+    CONN_RACE_WON = lambda node, qualified : f'''[{node}]: fastest of {qualified} qualified nodes'''
+    POOL_MEMBER_REPLACING = lambda node : f'''[{node}]: pool member is dead, replacing...'''
     
     #Messages pertaining to sending / Reciving messages
     MSG_SENDING = lambda command, node : f'''[{node}]:[{command}]: Sending request..'''
     MSG_SENT = NotImplemented
     MSG_RECIVING = NotImplemented
     MSG_RECIVED = lambda response, command, node : f'''[{node}]:[{command}]: retrived response {response} {SUCCESS}'''
+    MSG_SPLITTING = lambda command, items, node : f'''[{node}]:[{command}]: response for {items} items exceeds max receive size, splitting request..'''
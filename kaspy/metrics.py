@@ -0,0 +1,164 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Dict, Iterable, Union
+
+from kaspy.defines import LATENCY_BUCKETS, METRICS_RATE_WINDOW, SIZE_BUCKETS
+
+
+class Histogram:
+    '''counts of observations per fixed bucket, by upper bound, the last bucket counts everything above the highest bound'''
+
+    def __init__(self, buckets: Iterable[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value) # first bound the value does not exceed
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> Union[float, None]:
+        '''the upper bound of the bucket holding the `q` quantile, None without observations'''
+        counts = list(self.counts)
+        rank = q * sum(counts)
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if count and seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, buckets = 0, []
+        for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += bucket_count
+            buckets.append([bound, cumulative])
+        return {'count': count, 'sum': total, 'buckets': buckets, 'p50': self.quantile(0.5), 'p99': self.quantile(0.99)}
+
+
+class RateCounter:
+    '''a running total, and its rate per second over the last `window` seconds'''
+
+    def __init__(self, window: int = METRICS_RATE_WINDOW) -> None:
+        self.total = 0
+        self.window = window
+        self._seconds = deque() # [second, count], oldest first
+        self._lock = threading.Lock()
+
+    def add(self, count: int = 1):
+        second = int(time.monotonic())
+        with self._lock:
+            self.total += count
+            if self._seconds and self._seconds[-1][0] == second:
+                self._seconds[-1][1] += count
+            else:
+                self._seconds.append([second, count])
+                while self._seconds[0][0] <= second - self.window:
+                    self._seconds.popleft()
+
+    @property
+    def rate(self) -> float:
+        since = int(time.monotonic()) - self.window
+        with self._lock:
+            return sum(count for second, count in self._seconds if second > since) / self.window
+
+
+class ClientMetrics:
+    '''per command histograms of where the time of a request goes, and notification rates, recorded by the streams of a client.
+
+    `enqueue_to_send_seconds` is the wait from `submit` until the message stream takes the request, `round_trip_seconds` from there
+    to the response, both by request command. `decode_seconds` (protobuf parsing) and `response_size_bytes` are by received message,
+    responses and notifications alike, `to_dict_seconds` by message converted to a dict. shared by the members of a `RPCClientPool`'''
+
+    HISTOGRAMS = { # histogram -> label of its series
+        'enqueue_to_send_seconds': 'command',
+        'round_trip_seconds': 'command',
+        'decode_seconds': 'message',
+        'to_dict_seconds': 'message',
+        'response_size_bytes': 'message',
+    }
+
+    def __init__(self, latency_buckets: Iterable[float] = LATENCY_BUCKETS, size_buckets: Iterable[float] = SIZE_BUCKETS,
+                 rate_window: int = METRICS_RATE_WINDOW) -> None:
+        self.latency_buckets = tuple(latency_buckets)
+        self.size_buckets = tuple(size_buckets)
+        self.rate_window = rate_window
+        self.histograms = {name: {} for name in self.HISTOGRAMS} # histogram -> label value -> Histogram
+        self.notifications = {} # notification -> RateCounter
+        self._lock = threading.Lock()
+
+    def _histogram(self, name: str, key: str) -> Histogram:
+        histogram = self.histograms[name].get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms[name].setdefault(
+                    key, Histogram(self.size_buckets if name == 'response_size_bytes' else self.latency_buckets))
+        return histogram
+
+    def observe(self, name: str, key: str, value: float):
+        self._histogram(name, key).observe(value)
+
+    def notification(self, name: str):
+        counter = self.notifications.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self.notifications.setdefault(name, RateCounter(self.rate_window))
+        counter.add()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'histograms': {name: {key: histogram.snapshot() for key, histogram in tuple(histograms.items())}
+                           for name, histograms in self.histograms.items()},
+            'notifications': {name: {'total': counter.total, 'rate': counter.rate} for name, counter in tuple(self.notifications.items())},
+        }
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{name}="{str(value)}"' for name, value in labels.items() if value is not None) + '}'
+
+
+def _number(value: Union[int, float, str]) -> str:
+    return value if isinstance(value, str) else repr(value)
+
+
+def prometheus_text(stats: Dict[str, Any], prefix: str = 'kaspy') -> str:
+    '''renders the `stats()` of a client, or of a `RPCClientPool`, in the Prometheus text exposition format'''
+    lines = []
+    node = stats.get('node')
+    members = stats.get('members', [stats] if 'queues' in stats else [])
+    lines.append(f'# TYPE {prefix}_queue_depth gauge')
+    for member in members:
+        for queue, depth in member['queues'].items():
+            if isinstance(depth, dict): # per subscription or notification stream
+                for command, command_depth in depth.items():
+                    lines.append(f'{prefix}_queue_depth{_labels(node=member["node"], queue=queue, command=command)} {command_depth}')
+            else:
+                lines.append(f'{prefix}_queue_depth{_labels(node=member["node"], queue=queue)} {depth}')
+    notifications = stats.get('notifications', {})
+    if notifications:
+        lines.append(f'# TYPE {prefix}_notifications_total counter')
+        for name, counter in notifications.items():
+            lines.append(f'{prefix}_notifications_total{_labels(node=node, notification=name)} {counter["total"]}')
+        lines.append(f'# TYPE {prefix}_notifications_per_second gauge')
+        for name, counter in notifications.items():
+            lines.append(f'{prefix}_notifications_per_second{_labels(node=node, notification=name)} {_number(counter["rate"])}')
+    for name, histograms in stats.get('histograms', {}).items():
+        if not histograms:
+            continue
+        label = ClientMetrics.HISTOGRAMS.get(name, 'key')
+        lines.append(f'# TYPE {prefix}_{name} histogram')
+        for key, histogram in histograms.items():
+            for bound, count in histogram['buckets']:
+                lines.append(f'{prefix}_{name}_bucket{_labels(node=node, **{label: key}, le=_number(bound))} {count}')
+            lines.append(f'{prefix}_{name}_sum{_labels(node=node, **{label: key})} {_number(histogram["sum"])}')
+            lines.append(f'{prefix}_{name}_count{_labels(node=node, **{label: key})} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
@@ -1,9 +1,9 @@
 from logging import getLogger, basicConfig, INFO
 from typing import Set, Union, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import socket
 import time
 from kaspy.log_handler.log_messages import network as net_lm
-from kaspy.defines import MAINNET, P2P_DEF_PORTS, RPC_DEF_PORTS
 
 basicConfig(level=INFO)
 LOG = getLogger('[KASPA_NOD]')
@@ -47,6 +47,7 @@ class Node:
         self.version = UNKNOWEN
         self.protocol = UNKNOWEN
         self.utxoindex = UNKNOWEN
+        self.last_latency = None # latency of the last port probe, in seconds
     
     def port_open(self, timeout :float) -> bool:
         return bool(self.latency(timeout))
@@ -75,19 +76,46 @@ class node_acquirer:
     ]
     
     @classmethod
-    def yield_open_nodes(cls, port: Union[str, int]) -> Iterator[Node]:
+    def yield_open_nodes(cls, port: Union[str, int], timeout: float = 3, max_in_flight: int = 32, 
+                         passes: Union[int, None] = None) -> Iterator[Node]:
+        '''resolves the dns seeds in parallel and probes their nodes concurrently, with at most `max_in_flight` lookups at once.
+        
+        nodes are yielded as soon as their port answers within `timeout`, so faster nodes come first, with `Node.last_latency` set. 
+        the seeds are scanned again and again, or `passes` times'''
         LOG.info(net_lm.SCANNING)
-        while True:
+        scans = 0
+        while passes is None or scans < passes:
+            scans += 1
             scanned = set()
-            for dns_server in cls.dns_seed_servers:
-                addresses = query_node.connected_peers(ip=dns_server, port=RPC_DEF_PORTS[MAINNET])
-                if not addresses: continue
-                addresses = addresses - scanned
-                LOG.info(net_lm.SCANNING_RETRIVED_NODES_FROM(dns_server, addresses))
-                if not addresses: continue
-                for addr in addresses:
-                    node = Node(*addr.rsplit(':', 1))
-                    LOG.info(net_lm.CHECK_NODE(node))
-                    if node in scanned: continue
-                    scanned.add(node)
-                    yield node
+            pool = ThreadPoolExecutor(max_in_flight)
+            resolving = {pool.submit(query_node.connected_peers, dns_server, port): dns_server for dns_server in cls.dns_seed_servers}
+            probing = {}
+            pending = set(resolving)
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future in resolving:
+                            dns_server = resolving.pop(future)
+                            addresses = future.result()
+                            if not addresses: continue
+                            addresses = addresses - scanned
+                            LOG.info(net_lm.SCANNING_RETRIVED_NODES_FROM(dns_server, addresses))
+                            for addr in addresses:
+                                scanned.add(addr)
+                                node = Node(*addr.rsplit(':', 1))
+                                LOG.info(net_lm.CHECK_NODE(node))
+                                probe = pool.submit(node.latency, timeout)
+                                probing[probe] = node
+                                pending.add(probe)
+                        else:
+                            node = probing.pop(future)
+                            node.last_latency = future.result()
+                            if node.last_latency is None: continue
+                            yield node
+            finally: # the consumer may stop early, don't wait for the remaining probes
+                for future in pending:
+                    future.cancel()
+                pool.shutdown(wait=False)
+            if not scanned and (passes is None or scans < passes): # no seed answered, don't spin
+                time.sleep(timeout)
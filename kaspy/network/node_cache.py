@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import time
+from logging import getLogger
+from typing import Dict, Iterator, List, Union
+
+from kaspy.network.node import UNKNOWEN, Node
+from kaspy.defines import NODE_CACHE_PATH, NODE_CACHE_MAX_AGE, NODE_CACHE_MAX_FAILURES
+from kaspy.utils.version_comparer import version as ver
+
+LOG = getLogger('[KASPA_NOD]')
+
+
+class NodeCache:
+    '''json file of nodes that answered before, so `auto_connect` can skip the dns seed scan.
+
+    per node ("ip:port") it keeps the last latency, kaspad version, network, utxoindex flag, last success time and failures since.
+    nodes which have not answered for `max_age` seconds, or failed `max_failures` times in a row, are not offered anymore'''
+
+    _opened = {} # path -> cache, shared by the clients of a process
+    _opened_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path: str = NODE_CACHE_PATH) -> 'NodeCache':
+        '''returns the cache of `path`, loaded once per process'''
+        path = os.path.expanduser(path)
+        with cls._opened_lock:
+            if path not in cls._opened:
+                cls._opened[path] = cls(path)
+            return cls._opened[path]
+
+    def __init__(self, path: str = NODE_CACHE_PATH, max_age: float = NODE_CACHE_MAX_AGE, max_failures: int = NODE_CACHE_MAX_FAILURES) -> None:
+        self.path = os.path.expanduser(path)
+        self.max_age = max_age
+        self.max_failures = max_failures
+        self.refreshed = False # set once a background refresh was started
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError) as e: # missing or corrupt, start over
+            LOG.debug(e)
+            return {}
+
+    def save(self):
+        '''writes the cache to a temporary file first, so concurrent readers never see a partial file'''
+        with self._lock:
+            self._expire()
+            data = json.dumps(self._entries, indent=1)
+        directory = os.path.dirname(self.path)
+        tmp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e: # a read only home should not break connecting
+            LOG.debug(e)
+
+    def _expire(self):
+        now = time.time()
+        for key in [key for key, entry in self._entries.items() if now - entry.get('last_success', 0) > self.max_age]:
+            del self._entries[key]
+
+    def record_success(self, node: Node, save: bool = True):
+        '''stores what is known about `node`, and resets its failures'''
+        entry = {
+            'latency': node.last_latency,
+            'version': None if str(node.version) == UNKNOWEN else str(node.version),
+            'network': None if str(node.network) == UNKNOWEN else node.network,
+            'utxoindex': None if node.utxoindex == UNKNOWEN else bool(node.utxoindex),
+            'last_success': time.time(),
+            'failures': 0,
+        }
+        with self._lock:
+            previous = self._entries.get(str(node), {})
+            self._entries[str(node)] = {key: previous.get(key) if value is None else value for key, value in entry.items()}
+        if save:
+            self.save()
+
+    def record_failure(self, node: Node, save: bool = True):
+        with self._lock:
+            entry = self._entries.get(str(node))
+            if entry is None:
+                return None
+            entry['failures'] = entry.get('failures', 0) + 1
+        if save:
+            self.save()
+
+    def score(self, entry: dict) -> float:
+        '''lower is better, the last latency weighted by failures since the last success and by age'''
+        latency = entry.get('latency') or 1.0
+        age = time.time() - entry.get('last_success', 0)
+        return latency * (1 + entry.get('failures', 0)) * (1 + age / self.max_age)
+
+    def ranked(self, port: Union[int, str, None] = None, network: Union[str, None] = None, utxoindex: bool = False,
+               min_kaspad_version: Union[ver, str, None] = None, limit: Union[int, None] = None) -> List[Node]:
+        '''cached nodes which match, best score first, with `Node` attributes filled in from the cache'''
+        if isinstance(min_kaspad_version, str):
+            min_kaspad_version = ver.parse_from_string(min_kaspad_version)
+        now = time.time()
+        with self._lock:
+            entries = list(self._entries.items())
+        candidates = []
+        for key, entry in entries:
+            ip, node_port = key.rsplit(':', 1)
+            if now - entry.get('last_success', 0) > self.max_age or entry.get('failures', 0) >= self.max_failures:
+                continue
+            if port is not None and int(node_port) != int(port):
+                continue
+            if network and entry.get('network') not in (None, network):
+                continue
+            if utxoindex and entry.get('utxoindex') is False:
+                continue
+            version = ver.parse_from_string(entry['version']) if entry.get('version') else None
+            if min_kaspad_version and version and version < min_kaspad_version:
+                continue
+            node = Node(ip, node_port)
+            node.last_latency = entry.get('latency')
+            if version:
+                node.version = version
+            if entry.get('network'):
+                node.network = entry['network']
+            if entry.get('utxoindex') is not None:
+                node.utxoindex = entry['utxoindex']
+            candidates.append((self.score(entry), node))
+        candidates.sort(key=lambda candidate: candidate[0])
+        return [node for _, node in candidates[:limit]]
+
+    def yield_open_nodes(self, port: Union[int, str, None] = None, network: Union[str, None] = None, utxoindex: bool = False,
+                         min_kaspad_version: Union[ver, str, None] = None, timeout: float = 3) -> Iterator[Node]:
+        '''like `node_acquirer.yield_open_nodes`, but over the ranked cached nodes, probed one by one'''
+        for node in self.ranked(port, network, utxoindex, min_kaspad_version):
+            node.last_latency = node.latency(timeout)
+            if node.last_latency is None:
+                self.record_failure(node)
+                continue
+            yield node
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Union
+
+from kaspy.protos.messages_pb2 import KaspadMessage
+from kaspy.defines import CACHE_FOREVER, RESPONSE_CACHE_TTLS
+from kaspy.utils.commands import COMMANDS, serialize_request
+
+
+class ResponseCache:
+    '''bounded LRU of responses, for the commands in `ttls` (command -> seconds, or `CACHE_FOREVER`).
+
+    responses are keyed by node, command and serialized payload. responses cached forever are content addressed
+    (i.e. `getBlockRequest` by hash), and shared between nodes. responses carrying an error are not cached.
+    raw responses served from the cache are shared, and should not be modified'''
+
+    def __init__(self, maxsize: int = 1024, ttls: Union[Dict[str, float], None] = None) -> None:
+        self.maxsize = maxsize
+        self.ttls = dict(RESPONSE_CACHE_TTLS if ttls is None else ttls)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # key -> (expires, response)
+        self._lock = threading.Lock()
+
+    def key(self, node, command: str, payload: Union[dict, str, None]) -> Union[Hashable, None]:
+        '''the cache key of a request, None if `command` is not cached'''
+        ttl = self.ttls.get(command)
+        if ttl is None:
+            return None
+        request = serialize_request(COMMANDS[command].build(payload))
+        return (command, request) if ttl == CACHE_FOREVER else (str(node), command, request)
+
+    def get(self, key: Hashable) -> Union[KaspadMessage, None]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, response: KaspadMessage):
+        if getattr(response, response.WhichOneof('payload')).error.message:
+            return None
+        ttl = self.ttls[key[-2]]
+        with self._lock:
+            self._entries[key] = (None if ttl == CACHE_FOREVER else time.monotonic() + ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self) -> Dict[str, Union[int, float]]:
+        requests = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / requests if requests else 0.0, 'size': len(self)}
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,38 +1,78 @@
 from kaspy.protos.messages_pb2_grpc import RPCStub, P2PStub
-from kaspy.protos.messages_pb2 import _KASPADMESSAGE, KaspadMessage
+from kaspy.protos.messages_pb2 import KaspadMessage
 from kaspy.network.node import Node
-from kaspy.defines import CONNECTED, DISCONNECTED, CLOSED
+from kaspy.utils.commands import COMMANDS, serialize_request
+from kaspy.defines import CONNECTED, DISCONNECTED, CLOSED, DROP_OLDEST, NON_IDEMPOTENT_COMMANDS
+from kaspy.hooks import HOOKS
 
+import asyncio
 import grpc
 import json
 import sys
-from queue import Empty, SimpleQueue
+import time
+from collections import defaultdict, deque
+from itertools import count
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from queue import Empty, Queue, SimpleQueue
 from google.protobuf import json_format
 from typing import Any, Callable, Union
-from threading import Event, Thread
-from .excepts.exceptions import InvalidCommand
+from threading import Event, Lock, Thread
+from .excepts.exceptions import InvalidCommand, RPCResponseException
+from .dispatchers import PoolDispatcher
 
 grpc.max_send_message_length = -1
 grpc.max_receive_message_length = -1
 
+MESSAGE_STREAM_METHODS = {
+    RPCStub: '/protowire.RPC/MessageStream',
+    P2PStub: '/protowire.P2P/MessageStream',
+}
+
+class _Timed:
+    '''a request queued with metrics or hooks enabled, timestamped on its way to the message stream'''
+    
+    __slots__ = ('request', 'command', 'future', 'enqueued', 'sent')
+    
+    def __init__(self, request: Union[KaspadMessage, bytes], command: str, future: Future) -> None:
+        self.request = request
+        self.command = command
+        self.future = future
+        self.enqueued = time.perf_counter()
+        self.sent = None
+
 class BaseStream:
     
-    def __init__(self, node: Node, stub: Union[RPCStub, P2PStub], idle_timeout: float = None, max_receive_size=(1024**2)*4):
-        self._conn = grpc.insecure_channel(
+    def __init__(self, node: Node, stub: Union[RPCStub, P2PStub], idle_timeout: float = None, max_receive_size=(1024**2)*4, 
+                 channel: Union[grpc.Channel, None] = None):
+        self._owns_channel = channel is None # a shared channel is left open on close, only our call is cancelled
+        self._conn = channel if channel else grpc.insecure_channel(
             f'{node}',
             options = [
                 ('grpc.max_send_message_length', -1),
                 ('grpc.max_receive_message_length', max_receive_size)
                     ]
                 )
-        self._stub = stub(self._conn)
+        self._message_stream = self._conn.stream_stream( # same method as `stub.MessageStream`, but accepts pre-serialized requests
+            MESSAGE_STREAM_METHODS[stub],
+            request_serializer=serialize_request,
+            response_deserializer=self._deserialize,
+                )
+        self.node = node
+        self.metrics = None # ClientMetrics recording the stream, if set
         self._halt = Event()
         self._idle_timeout = idle_timeout
         self._inputs = SimpleQueue()
+        self._call = None
+        self._thread = None
         self.status = CONNECTED
 
     def start(self):
-        Thread(target=self.run, daemon=True).start()
+        self._thread = Thread(target=self.run, daemon=True)
+        self._thread.start()
+    
+    def is_alive(self) -> bool:
+        '''the stream is open and its reader has not died on an error'''
+        return self.status != CLOSED and self._thread is not None and self._thread.is_alive()
     
     def run(self):
         self.status = CONNECTED
@@ -41,23 +81,37 @@ class BaseStream:
     
     def switch(self):
         self._halt.wait()
-        try:
-            for resp in self._stub.MessageStream((inp for inp in self.loop()), timeout=self._idle_timeout):
-                resp = self._serialize_response_to_dict(resp)
-                self.process_output(resp)
-        except (grpc.RpcError, StopIteration) as e:
-            if self.status == CLOSED:
-                pass
-            else:
-                raise e
+        while True:
+            self._on_stream_open()
+            try:
+                self._call = self._message_stream((inp for inp in self.loop()), timeout=self._idle_timeout)
+                for resp in self._call:
+                    self.process_output(resp) # responses stay as KaspadMessage, conversion is left to the consumer
+                return None
+            except (grpc.RpcError, StopIteration) as e:
+                self._on_stream_error(e)
+                if self.status == CLOSED:
+                    return None
+                if not self._reopen_after(e):
+                    raise e
     
     def loop(self):
+        inputs = self._inputs # bound per message stream, a reopened stream gets a fresh queue
         while True:
-            inp =  self._inputs.get()
-            if inp == DISCONNECTED:
+            inp =  inputs.get()
+            if inp is DISCONNECTED:
                 self.switch()
+            elif inp is CLOSED:
+                return None
+            elif inp.__class__ is _Timed:
+                inp.sent = time.perf_counter()
+                if self.metrics is not None:
+                    self.metrics.observe('enqueue_to_send_seconds', inp.command, inp.sent - inp.enqueued)
+                if HOOKS.post_send:
+                    HOOKS.fire(HOOKS.post_send, self.node, inp.command, inp.future)
+                yield inp.request
             else:
-                yield self._serialize_request(*inp)
+                yield inp
     
     def disconnect(self):
         self._halt.clear()
@@ -70,28 +124,93 @@ class BaseStream:
     
     def close(self):
         self.status = CLOSED
-        self._conn.close()    
+        self._inputs.put(CLOSED) # ends the request iterator
+        if self._owns_channel:
+            self._conn.close()
+        elif self._call:
+            self._call.cancel()
 
     def process_output(self, output):
         raise NotImplementedError
     
-    def _serialize_request(self, command : str, payload : Union[dict, str, None] = {}) -> KaspadMessage:
-        if payload is None: payload = {}
-        if command == _KASPADMESSAGE.fields_by_name[command].name: # this is important so we don't execute arbitary python code in this function
-            kaspa_msg = KaspadMessage()
-            app_msg = eval(f'kaspa_msg.{command}') #should not use eval - but seems like the easiest way for now.
-            if payload:
-                if isinstance(payload, dict):
-                    json_format.ParseDict(payload, app_msg)
-                if isinstance(payload, str):
-                    json_format.Parse(payload, app_msg)
-            app_msg.SetInParent()
-            return kaspa_msg
-        else:
+    def _on_stream_open(self):
+        pass
+    
+    def _on_stream_error(self, err: Exception):
+        pass
+    
+    def _reopen_after(self, err: Exception) -> bool:
+        return False
+    
+    def _serialize_request(self, command : str, payload : Union[dict, str, None] = None) -> Union[KaspadMessage, bytes]:
+        registered = COMMANDS.get(command) # only commands found in the KaspadMessage descriptor can be built
+        if registered is None:
             raise InvalidCommand(self.node, command)
+        return registered.build(payload)
     
     def _serialize_response_to_dict(self, response: KaspadMessage) -> dict:
         return json_format.MessageToDict(response)
+    
+    def _serialize_output(self, response: KaspadMessage, raw: bool = False) -> Union[KaspadMessage, dict]:
+        '''only pay for the dict conversion if it is asked for'''
+        if raw:
+            return response
+        if self.metrics is None:
+            return self._serialize_response_to_dict(response)
+        start = time.perf_counter()
+        output = self._serialize_response_to_dict(response)
+        self.metrics.observe('to_dict_seconds', response.WhichOneof('payload'), time.perf_counter() - start)
+        return output
+    
+    def _deserialize(self, data: bytes) -> KaspadMessage:
+        if self.metrics is None and not HOOKS.decode_finished:
+            return KaspadMessage.FromString(data)
+        start = time.perf_counter()
+        output = KaspadMessage.FromString(data)
+        elapsed = time.perf_counter() - start
+        name = output.WhichOneof('payload')
+        if self.metrics is not None:
+            self.metrics.observe('decode_seconds', name, elapsed)
+            self.metrics.observe('response_size_bytes', name, len(data))
+        if HOOKS.decode_finished:
+            HOOKS.fire(HOOKS.decode_finished, self.node, name, elapsed, len(data))
+        return output
+
+class Subscription:
+    
+    def __init__(self, command: str, payload: Union[dict, str, None], callback: Callable[[Union[dict, KaspadMessage]], Any], raw: bool = False, 
+                 dispatcher = None):
+        '''a subscription multiplexed onto a `RequestStream`, which routes notifications to it by their oneof field name'''
+        self.command = command
+        self.payload = payload
+        self.notifications = COMMANDS[command].notifications
+        self.raw = raw
+        self._callback = callback
+        # one ordered worker, bounded, dropping the oldest when full, the stream's reader thread never waits on a slow callback
+        self._dispatcher = dispatcher if dispatcher else PoolDispatcher(overflow=DROP_OLDEST)
+    
+    def process_output(self, notification: Union[dict, KaspadMessage]):
+        '''dispatches a notification, already converted by the stream as `raw` asks'''
+        callback = self._traced_callback if HOOKS.callback_start or HOOKS.callback_end else self._callback
+        self._dispatcher.dispatch(callback, notification)
+    
+    def _traced_callback(self, notification: Any):
+        HOOKS.fire(HOOKS.callback_start, self.command, notification)
+        start, error = time.perf_counter(), None
+        try:
+            return self._callback(notification)
+        except Exception as e:
+            error = e
+            raise e
+        finally:
+            HOOKS.fire(HOOKS.callback_end, self.command, notification, time.perf_counter() - start, error)
+    
+    @property
+    def queue_depth(self) -> int:
+        return self._dispatcher.queue_depth
+    
+    def close(self):
+        self._dispatcher.close()
 
 class RequestStream(BaseStream):
     
@@ -99,45 +218,276 @@ class RequestStream(BaseStream):
         super().__init__(node, stub, idle_timeout=idle_timeout,  max_receive_size=max_receive_size)
         self._outputs = SimpleQueue()
         self.filter = filter
+        self._in_flight = defaultdict(deque) # expected response name -> futures, in the order the requests were sent
+        self._in_flight_lock = Lock()
+        self._sent = count() # orders the requests over all kinds, to send them again in order
+        self._isolating = None # requests sent one at a time after an oversized message, until it is traced to one
+        self._subscriptions = {} # notify command -> Subscription
+        self._routes = {} # notification name -> Subscription
+        self._muted = set() # notification names of detached subscriptions, still sent where kaspad has no stop request
+        self.generation = 0 # counts the message streams opened, subscriptions are renewed on each new one
         
-    def get(self, timeout: Union[int, float, None] = None) -> KaspadMessage:
+    def get(self, timeout: Union[int, float, None] = None, raw: bool = False) -> Union[KaspadMessage, dict]:
         try:
-            return self._outputs.get(timeout=timeout)
+            return self._serialize_output(self._outputs.get(timeout=timeout), raw)
         except Empty:
             raise TimeoutError
     
     def put(self, input):
-        self._inputs.put(input)
+        '''sends a request, its response is left for `get`'''
+        self.submit(*input).add_done_callback(self._put_output)
+    
+    def submit(self, command: str, payload: Union[dict, str, None] = None) -> Future:
+        '''sends a request, and returns a future which resolves to its response'''
+        request = self._serialize_request(command, payload) # serialize in the caller's thread, errors surface there too
+        response = COMMANDS[command].response
+        if response is None: # nothing to correlate with, i.e. sending a response
+            raise InvalidCommand(self.node, command)
+        future = Future()
+        if self.metrics is not None or HOOKS.post_send or HOOKS.response_received:
+            request = future.timed = _Timed(request, command, future) # read back by `process_output` for the round trip
+        if HOOKS.pre_send:
+            HOOKS.fire(HOOKS.pre_send, self.node, command, future)
+        with self._in_flight_lock: # kaspad answers requests of the same kind in order, so queue and send under one lock
+            future.resend = (next(self._sent), command, response, request) # to send it again on a reopened stream
+            future.strikes = 0 # oversized messages received while it was alone in flight
+            if self._isolating is not None:
+                self._isolating.append(future)
+                self._send_isolated()
+            else:
+                self._send(future)
+        return future
+    
+    def _send(self, future: Future):
+        _, _, response, request = future.resend
+        self._in_flight[response].append(future)
+        self._inputs.put(request)
+    
+    def _send_isolated(self):
+        '''sends the next isolated request once nothing is in flight, and pipelines again once all are answered'''
+        if any(self._in_flight.values()):
+            return None
+        while self._isolating:
+            future = self._isolating.popleft()
+            if not future.cancelled():
+                self._send(future)
+                return None
+        self._isolating = None
+    
+    def wait(self, future: Future, timeout: Union[int, float, None] = None, raw: bool = False) -> Union[KaspadMessage, dict]:
+        '''waits on a future from `submit`. a timed out future is cancelled, but keeps its place in line, 
+        so its late response is discarded instead of being handed to the next request of the same kind'''
+        try:
+            return self._serialize_output(future.result(timeout=timeout), raw)
+        except FutureTimeoutError:
+            if future.cancel():
+                raise TimeoutError
+        return self._serialize_output(future.result(), raw) # resolved while timing out
+    
+    def attach(self, subscription: Subscription) -> Future:
+        '''routes notifications to `subscription`, and sends its notify request'''
+        self._subscriptions[subscription.command] = subscription
+        for notification in subscription.notifications:
+            self._routes[notification] = subscription
+            self._muted.discard(notification)
+        return self.submit(subscription.command, subscription.payload)
+    
+    def detach(self, command: str, stop: bool = True) -> Union[Future, None]:
+        '''stops routing notifications of `command`, and sends the matching `stopNotifying` request where one exists. 
+        notifications still arriving for it are dropped, rather than left for `get`'''
+        subscription = self._subscriptions.pop(command, None)
+        if subscription is None:
+            return None
+        for notification in subscription.notifications:
+            if self._routes.get(notification) is subscription:
+                del self._routes[notification]
+                self._muted.add(notification)
+        subscription.close()
+        stop_command = COMMANDS[command].stop
+        if stop and stop_command:
+            return self.submit(stop_command, subscription.payload)
+        return None
+    
+    @property
+    def in_flight(self) -> int:
+        '''requests still waited on, timed out requests waiting for their late response are not counted'''
+        isolating = tuple(self._isolating or ())
+        return sum(not future.cancelled() for futures in tuple(self._in_flight.values()) + (isolating,) for future in tuple(futures))
+    
+    def _on_stream_open(self):
+        if self.generation: # the node forgets subscriptions with the stream they were made on
+            if HOOKS.reconnect:
+                HOOKS.fire(HOOKS.reconnect, self.node, 'stream reopened')
+            for subscription in tuple(self._subscriptions.values()):
+                self.submit(subscription.command, subscription.payload)
+        self.generation += 1
+    
+    def _put_output(self, future: Future):
+        if not future.exception():
+            self._outputs.put(future.result())
+    
+    def _on_stream_error(self, err: Exception):
+        with self._in_flight_lock:
+            pending = sorted((future for futures in self._in_flight.values() for future in futures), key=lambda future: future.resend[0])
+            self._in_flight.clear()
+            if self._reopen_after(err):
+                inputs, self._inputs = self._inputs, SimpleQueue()
+                inputs.put(CLOSED) # ends the failed stream's request iterator
+                pending = self._isolate(pending)
+            elif self._isolating:
+                pending.extend(self._isolating)
+                self._isolating = None
+        for future in pending:
+            if not future.done():
+                future.set_exception(err)
+    
+    def _isolate(self, pending: list) -> list:
+        '''after an oversized message, returns the requests to fail with it, the others are sent again one at a time.
+        
+        the message is only known to be a request's response when that request was alone in flight, and no subscription 
+        could have sent it, or it was alone twice. requests kaspad may already have run are failed, not sent again'''
+        if len(pending) == 1:
+            pending[0].strikes += 1
+            if not self._subscriptions or pending[0].strikes > 1:
+                if self._isolating is not None:
+                    self._send_isolated()
+                return pending
+        failed, resend = [], list(self._isolating or ())
+        for future in pending:
+            if future.resend[1] in NON_IDEMPOTENT_COMMANDS:
+                failed.append(future)
+            elif not future.cancelled():
+                resend.append(future)
+        self._isolating = deque(sorted(resend, key=lambda future: future.resend[0]))
+        self._send_isolated()
+        return failed
+    
+    def _reopen_after(self, err: Exception) -> bool:
+        '''an oversized response only fails the call, the channel is fine'''
+        return isinstance(err, grpc.RpcError) and err.code() == grpc.StatusCode.RESOURCE_EXHAUSTED and self.status != CLOSED
     
     def process_output(self, output):
-        test = next(iter(output.keys()))
+        test = output.WhichOneof('payload')
         if test in self.filter:
-            pass
-        else:
+            return None
+        subscription = self._routes.get(test)
+        if subscription is not None:
+            if self.metrics is not None:
+                self.metrics.notification(test)
+            subscription.process_output(self._serialize_output(output, subscription.raw)) # timed as `to_dict_seconds`
+            return None
+        if test in self._muted:
+            return None
+        with self._in_flight_lock:
+            pending = self._in_flight.get(test)
+            future = pending.popleft() if pending else None
+            if future is not None and self._isolating is not None:
+                self._send_isolated()
+        if future is not None and not future.set_running_or_notify_cancel(): # the late response of a timed out request
+            return None
+        if future is None: # unsolicited, i.e. a notification
+            if self.metrics is not None:
+                self.metrics.notification(test)
             self._outputs.put(output)
+        else:
+            timed = getattr(future, 'timed', None)
+            if timed is not None and timed.sent is not None and self.metrics is not None:
+                self.metrics.observe('round_trip_seconds', timed.command, time.perf_counter() - timed.sent)
+            if HOOKS.response_received:
+                HOOKS.fire(HOOKS.response_received, self.node, timed.command if timed is not None else test, future, output)
+            future.set_result(output)
 
-class SubcribeStream(BaseStream):
+class NotificationStream(BaseStream):
     
-    def __init__(self, node, command: str, payload: Union[None,dict], callback: Callable[[dict], Any], stub: Union[RPCStub, P2PStub], idle_timeout: float = None, max_receive_size=(1024**2)*4):
-        super().__init__(node=node, stub=stub, idle_timeout=idle_timeout, max_receive_size=max_receive_size)
-        self.subscription = (command, payload)
-        sub_msg = command[6:].replace('Request', 'Notification')
-        self._sub_msg = sub_msg[0].lower() + sub_msg[1:]
-        self._callback = callback
-        self._hash =  hash(f'{self._sub_msg}')
+    _END = object()
+    
+    def __init__(self, node: Node, command: str, payload: Union[dict, str, None], stub: Union[RPCStub, P2PStub], channel: Union[grpc.Channel, None] = None, 
+                 maxsize: int = 1024, raw: bool = False, idle_timeout: float = None, max_receive_size=(1024**2)*4):
+        '''notifications of `command` pulled through a bounded queue, iterate over it with `for` or `async for`.
         
+        runs its own message stream, on a shared `channel` if given. when the queue is full the reader stops, 
+        and gRPC flow control holds back the node instead of buffering without limit'''
+        super().__init__(node, stub, idle_timeout=idle_timeout, max_receive_size=max_receive_size, channel=channel)
+        self.subscription = (command, payload)
+        self.notifications = COMMANDS[command].notifications
+        self._response = COMMANDS[command].response
+        self.raw = raw
+        self._outputs = Queue(maxsize)
+        self._error = None
+        self.on_close = None # called with the stream once it is closed or has ended, i.e. to forget it
+    
     def run(self):
         self._halt.set()
-        self._inputs.put(self.subscription)
-        self.switch()
+        self._inputs.put(self._serialize_request(*self.subscription))
+        try:
+            self.switch()
+        except (grpc.RpcError, StopIteration) as e:
+            if self.status != CLOSED:
+                self._error = e
+        self._closed()
+        self._outputs.put(self._END) # waits for room, the consumer drains the queue before reaching the end
     
-    def _send_thread_to_callback(self, output):
-        Thread(target=self._callback, args=(output,), daemon=True).start()
-        
-    def process_output(self, output):
-        if next(iter(output.keys())) == self._sub_msg:
-            self._send_thread_to_callback(output)
-            
+    def process_output(self, output: KaspadMessage):
+        name = output.WhichOneof('payload')
+        if name in self.notifications:
+            if self.metrics is not None:
+                self.metrics.notification(name)
+            self._outputs.put(output) # blocks while the consumer is behind
+        elif name == self._response and getattr(output, name).error.message:
+            self._error = RPCResponseException(self.node, self.subscription[0], getattr(output, name).error.message)
+            self.close()
+    
+    @property
+    def queue_depth(self) -> int:
+        return self._outputs.qsize()
+    
+    def close(self):
+        super().close()
+        self._closed()
+        try: # unblock a reader waiting for room
+            while True:
+                self._outputs.get_nowait()
+        except Empty:
+            pass
+    
+    def _closed(self):
+        on_close, self.on_close = self.on_close, None # once
+        if on_close is not None:
+            on_close(self)
+    
+    def _next(self) -> Union[KaspadMessage, dict, object]:
+        output = self._outputs.get()
+        if output is self._END:
+            self._outputs.put(self._END) # keep ending further calls
+            if self._error:
+                raise self._error
+            return self._END
+        return self._serialize_output(output, self.raw)
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self) -> Union[KaspadMessage, dict]:
+        output = self._next()
+        if output is self._END:
+            raise StopIteration
+        return output
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self) -> Union[KaspadMessage, dict]:
+        output = await asyncio.get_running_loop().run_in_executor(None, self._next)
+        if output is self._END:
+            raise StopAsyncIteration
+        return output
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
 class P2PRequestStream(BaseStream):
     
     def __init__(self, node: Node, stub: Union[RPCStub, P2PStub], idle_timeout: float = None, filter_inv = True, max_receive_size=(1024**2)*4):
@@ -145,17 +495,17 @@ class P2PRequestStream(BaseStream):
         self._outputs = SimpleQueue()
         self.filter = filter_inv
         
-    def get(self, timeout: Union[int, float, None] = None) -> KaspadMessage:
+    def get(self, timeout: Union[int, float, None] = None, raw: bool = False) -> Union[KaspadMessage, dict]:
         try:
-            return self._outputs.get(timeout=timeout)
+            return self._serialize_output(self._outputs.get(timeout=timeout), raw)
         except Empty:
             raise TimeoutError
     
     def put(self, input):
-        self._inputs.put(input)
+        self._inputs.put(self._serialize_request(*input))
     
     def process_output(self, output):
-        if self.filter and any(x in ('invRelayBlock', 'invTransactions') for x in output.keys()):
+        if self.filter and output.WhichOneof('payload') in ('invRelayBlock', 'invTransactions'):
             return None
         else:
             self._outputs.put(output)
\ No newline at end of file
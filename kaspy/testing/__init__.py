@@ -0,0 +1 @@
+from kaspy.testing.mock_kaspad import MockKaspad
@@ -0,0 +1,308 @@
+import random
+import threading
+import time
+from collections import Counter
+from concurrent import futures
+from logging import getLogger
+from queue import SimpleQueue
+from typing import Any, Callable, Dict, Union
+
+import grpc
+from google.protobuf import json_format
+from google.protobuf.message import Message
+
+from kaspy.protos.messages_pb2 import KaspadMessage
+from kaspy.protos.messages_pb2_grpc import RPCServicer, add_RPCServicer_to_server
+from kaspy.utils.commands import COMMANDS
+
+LOG = getLogger('[KASPA_MCK]')
+
+_PADDING_TAG = b'\xfa\xff\xff\xff\x0f' # length delimited field 536870911, unknown to KaspadMessage, skipped by the client
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte, value = value & 0x7f, value >> 7
+        out.append(byte | (0x80 if value else 0))
+        if not value:
+            return bytes(out)
+
+
+class _Abort:
+    '''ends a message stream with a status, from the thread serving it'''
+
+    def __init__(self, code: grpc.StatusCode, details: str) -> None:
+        self.code = code
+        self.details = details
+
+
+class MockKaspad(RPCServicer):
+    '''an in-process fake kaspad RPC server, to exercise clients without a node.
+
+    responses are generated for the common commands, over a synthetic chain of `chain_length` blocks, and can be replaced
+    per command with `respond(command, response)` by a dict, a response message, or a callable of the request message.
+    notify requests start a stream of generated notifications, `notification_rate` per second (None for as fast as possible),
+    until the matching stop request, or after `notification_count`.
+    `latency` (seconds, or a callable of the command) delays every response, `fail` answers with an error message or ends
+    the stream with a status code, `oversize` pads responses by a number of bytes, and `drop_streams` ends all open streams.
+
+        with MockKaspad() as kaspad:
+            client.connect('127.0.0.1', kaspad.port)
+    '''
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, workers: int = 16, chain_length: int = 1000, page_size: int = 100,
+                 latency: Union[float, Callable[[str], float]] = 0, notification_rate: Union[float, None] = 10,
+                 notification_count: Union[int, None] = None, utxos_per_address: int = 1, seed: int = 0) -> None:
+        self.host = host
+        self.chain = ['%064x' % (index + 1) for index in range(chain_length)]
+        self.page_size = page_size
+        self.latency = latency
+        self.notification_rate = notification_rate
+        self.notification_count = notification_count
+        self.utxos_per_address = utxos_per_address
+        self.virtual_daa_score = chain_length
+        self.requests = Counter() # command -> requests received
+        self.notifications = Counter() # notification -> notifications sent
+        self._random = random.Random(seed)
+        self._responses = {} # command -> dict, message or callable
+        self._failures = {} # command -> [error message, status code, remaining]
+        self._padding = {} # command or notification -> [bytes, times left or None]
+        self._generators = {
+            'getInfoRequest': self._info,
+            'getCurrentNetworkRequest': lambda request: {'currentNetwork': 'mainnet'},
+            'getBlockDagInfoRequest': self._block_dag_info,
+            'getBlockCountRequest': lambda request: {'blockCount': str(len(self.chain)), 'headerCount': str(len(self.chain))},
+            'getCoinSupplyRequest': lambda request: {'maxSompi': '2900000000000000000', 'circulatingSompi': '1000000000000000000'},
+            'getBlockRequest': lambda request: {'block': self._block(request.hash, request.includeTransactions)},
+            'getBlocksRequest': self._blocks,
+            'getVirtualSelectedParentChainFromBlockRequest': self._chain_from_block,
+            'getUtxosByAddressesRequest': self._utxos,
+            'getBalanceByAddressRequest': lambda request: {'balance': str(self.utxos_per_address * 100000000)},
+            'getBalancesByAddressesRequest': lambda request: {'entries': [{'address': address, 'balance': str(self.utxos_per_address * 100000000)}
+                                                                          for address in request.addresses]},
+        }
+        self._notification_generators = {
+            'blockAddedNotification': lambda index, request: {'block': self._block(self.chain[index % len(self.chain)], True)},
+            'virtualDaaScoreChangedNotification': lambda index, request: {'virtualDaaScore': str(self.virtual_daa_score + index)},
+            'virtualSelectedParentChainChangedNotification': lambda index, request: {'addedChainBlockHashes': [self.chain[index % len(self.chain)]]},
+            'utxosChangedNotification': self._utxos_changed,
+        }
+        self._streams = set() # queues of the open message streams
+        self._lock = threading.Lock()
+        self._server = grpc.server(futures.ThreadPoolExecutor(workers))
+        add_RPCServicer_to_server(self, self._server)
+        self.port = self._server.add_insecure_port(f'{host}:{port}')
+
+    # server
+
+    def start(self) -> 'MockKaspad':
+        self._server.start()
+        return self
+
+    def stop(self, grace: Union[float, None] = None):
+        self.drop_streams(grpc.StatusCode.UNAVAILABLE, 'server stopped')
+        self._server.stop(grace)
+
+    def __enter__(self) -> 'MockKaspad':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def address(self) -> str:
+        return f'{self.host}:{self.port}'
+
+    # configuration
+
+    def respond(self, command: str, response: Union[dict, Message, Callable[[Message], Union[dict, Message]]]):
+        '''replaces the generated response of `command`, a callable gets the request message, i.e. a `GetInfoRequestMessage`'''
+        self._responses[command] = response
+
+    def fail(self, command: str, message: Union[str, None] = None, status: Union[grpc.StatusCode, None] = None,
+             times: Union[int, None] = None):
+        '''answers `command` with an error `message`, or ends the stream with `status`, the next `times` times (None for always)'''
+        self._failures[command] = [message, status, times]
+
+    def oversize(self, command: str, size: int, times: Union[int, None] = None):
+        '''pads the responses of `command`, or the notifications by name, by `size` bytes, i.e. to exceed the `max_receive_size` 
+        of a client, the next `times` times (None for always)'''
+        self._padding[command] = [_PADDING_TAG + _varint(size) + bytes(size), times]
+    
+    def _pad(self, name: str, message: KaspadMessage):
+        padding = self._padding.get(name)
+        if padding is None:
+            return None
+        if padding[1] is not None:
+            padding[1] -= 1
+            if padding[1] <= 0:
+                self._padding.pop(name, None)
+        message.MergeFromString(padding[0])
+
+    def reset(self):
+        self._responses.clear()
+        self._failures.clear()
+        self._padding.clear()
+
+    def drop_streams(self, status: grpc.StatusCode = grpc.StatusCode.UNAVAILABLE, details: str = 'dropped by the mock'):
+        '''ends all open message streams with `status`, to exercise reconnects'''
+        with self._lock:
+            streams = tuple(self._streams)
+        for outputs in streams:
+            outputs.put(_Abort(status, details))
+
+    # service
+
+    def MessageStream(self, request_iterator, context):
+        outputs = SimpleQueue()
+        stopped = {} # notify command -> Event, set by its stop request
+        with self._lock:
+            self._streams.add(outputs)
+        threading.Thread(target=self._read, args=(request_iterator, outputs, stopped), daemon=True).start()
+        try:
+            while True:
+                output = outputs.get()
+                if output is None:
+                    return None
+                if isinstance(output, _Abort):
+                    context.abort(output.code, output.details)
+                yield output
+        finally:
+            with self._lock:
+                self._streams.discard(outputs)
+            for event in stopped.values():
+                event.set()
+
+    def _read(self, request_iterator, outputs: SimpleQueue, stopped: Dict[str, threading.Event]):
+        try:
+            for request in request_iterator:
+                command = request.WhichOneof('payload')
+                self.requests[command] += 1
+                self._answer(command, request, outputs, stopped)
+        except grpc.RpcError as e: # the client went away
+            LOG.debug(e)
+        outputs.put(None)
+
+    def _answer(self, command: str, request: KaspadMessage, outputs: SimpleQueue, stopped: Dict[str, threading.Event]):
+        registered = COMMANDS[command]
+        latency = self.latency(command) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+        failure = self._failures.get(command)
+        if failure and failure[2] is not None:
+            failure[2] -= 1
+            if failure[2] < 0:
+                del self._failures[command]
+                failure = None
+        if failure and failure[1] is not None:
+            outputs.put(_Abort(failure[1], failure[0] or f'{command} failed'))
+            return None
+        if registered.response is None:
+            return None
+        response = KaspadMessage()
+        message = getattr(response, registered.response)
+        message.SetInParent()
+        if failure:
+            message.error.message = failure[0]
+        else:
+            self._build(command, getattr(request, command), message)
+        self._pad(command, response)
+        outputs.put(response)
+        if registered.notifications and not failure:
+            event = stopped.setdefault(command, threading.Event())
+            event.clear()
+            threading.Thread(target=self._notify, args=(registered.notifications[0], getattr(request, command), outputs, event),
+                             daemon=True).start()
+        elif command.startswith('stopNotifying'):
+            event = stopped.get('notify' + command[len('stopNotifying'):])
+            if event:
+                event.set()
+
+    def _build(self, command: str, request: Message, message: Message):
+        source = self._responses.get(command, self._generators.get(command))
+        if source is None:
+            return None
+        response = source(request) if callable(source) else source
+        if isinstance(response, dict):
+            json_format.ParseDict(response, message)
+        elif response is not None:
+            message.CopyFrom(response)
+
+    def _notify(self, notification: str, request: Message, outputs: SimpleQueue, stopped: threading.Event):
+        generate = self._notification_generators.get(notification)
+        index = 0
+        while not stopped.is_set() and (self.notification_count is None or index < self.notification_count):
+            output = KaspadMessage()
+            message = getattr(output, notification)
+            message.SetInParent()
+            if generate:
+                json_format.ParseDict(generate(index, request), message)
+            self._pad(notification, output)
+            outputs.put(output)
+            self.notifications[notification] += 1
+            index += 1
+            if self.notification_rate:
+                stopped.wait(1 / self.notification_rate)
+
+    # generated responses
+
+    def _info(self, request) -> Dict[str, Any]:
+        return {'p2pId': 'mock', 'serverVersion': '0.12.11', 'isUtxoIndexed': True, 'isSynced': True}
+
+    def _block_dag_info(self, request) -> Dict[str, Any]:
+        self.virtual_daa_score += 1
+        return {'networkName': 'kaspa-mainnet', 'blockCount': str(len(self.chain)), 'headerCount': str(len(self.chain)),
+                'tipHashes': self.chain[-1:], 'virtualParentHashes': self.chain[-1:], 'pruningPointHash': self.chain[0],
+                'virtualDaaScore': str(self.virtual_daa_score), 'difficulty': 1.0}
+
+    def _block(self, block_hash: str, include_transactions: bool) -> Dict[str, Any]:
+        height = int(block_hash, 16) if block_hash else 0
+        block = {
+            'header': {'version': 1, 'timestamp': str(1600000000000 + height * 1000), 'daaScore': str(height), 'blueScore': str(height),
+                       'parents': [{'parentHashes': ['%064x' % (height - 1)]}] if height > 1 else []},
+            'verboseData': {'hash': block_hash, 'blueScore': str(height), 'isChainBlock': True,
+                            'selectedParentHash': '%064x' % (height - 1) if height > 1 else ''},
+        }
+        if include_transactions:
+            block['transactions'] = [{'version': 0, 'outputs': [{'amount': '50000000000', 'scriptPublicKey': {'scriptPublicKey': '20' + '00' * 32 + 'ac'}}],
+                                      'subnetworkId': '0100000000000000000000000000000000000000'}]
+        return block
+
+    def _position(self, block_hash: str) -> Union[int, None]:
+        try:
+            position = int(block_hash, 16) - 1
+        except ValueError:
+            return None
+        return position if 0 <= position < len(self.chain) else None
+
+    def _blocks(self, request) -> Dict[str, Any]:
+        start = self._position(request.lowHash) or 0
+        hashes = self.chain[start:start + self.page_size]
+        response = {'blockHashes': hashes}
+        if request.includeBlocks:
+            response['blocks'] = [self._block(block_hash, request.includeTransactions) for block_hash in hashes]
+        return response
+
+    def _chain_from_block(self, request) -> Dict[str, Any]:
+        start = self._position(request.startHash)
+        removed = [] if start is not None else [request.startHash]
+        start = start + 1 if start is not None else 0
+        added = self.chain[start:start + self.page_size]
+        response = {'removedChainBlockHashes': removed, 'addedChainBlockHashes': added}
+        if request.includeAcceptedTransactionIds:
+            response['acceptedTransactionIds'] = [{'acceptingBlockHash': block_hash, 'acceptedTransactionIds': [block_hash]} for block_hash in added]
+        return response
+
+    def _utxo_entry(self, address: str, transaction_id: str, index: int) -> Dict[str, Any]:
+        return {'address': address, 'outpoint': {'transactionId': transaction_id, 'index': index},
+                'utxoEntry': {'amount': '100000000', 'scriptPublicKey': {'scriptPublicKey': '20' + '00' * 32 + 'ac'},
+                              'blockDaaScore': str(self.virtual_daa_score)}}
+
+    def _utxos(self, request) -> Dict[str, Any]:
+        return {'entries': [self._utxo_entry(address, '%064x' % self._random.getrandbits(256), index)
+                            for address in request.addresses for index in range(self.utxos_per_address)]}
+
+    def _utxos_changed(self, index: int, request) -> Dict[str, Any]:
+        addresses = list(request.addresses) or ['kaspa:mock']
+        return {'added': [self._utxo_entry(addresses[index % len(addresses)], '%064x' % self._random.getrandbits(256), 0)]}
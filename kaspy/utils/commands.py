@@ -0,0 +1,64 @@
+from typing import Dict, Union
+from google.protobuf import json_format
+from google.protobuf.message import Message
+from kaspy.protos.messages_pb2 import KaspadMessage, _KASPADMESSAGE
+
+
+class Command(object):
+    '''a `KaspadMessage` payload field, resolved once from the descriptor so requests can be built without lookups'''
+
+    def __init__(self, field) -> None:
+        self.name = field.name
+        self.number = field.number
+        self.field = field
+        self.message_class = type(getattr(KaspadMessage(), field.name))
+        self.response = self._field_or_none(self.name[:-len('Request')] + 'Response') if self.name.endswith('Request') else None
+        self.notifications = self._notifications_of(self.response) if self.name.startswith('notify') else ()
+        self.stop = self._field_or_none('stopNotifying' + self.name[len('notify'):]) if self.notifications else None
+        empty_msg = KaspadMessage()
+        getattr(empty_msg, self.name).SetInParent()
+        self.empty_bytes = empty_msg.SerializeToString() # sent as is for payload-less requests, i.e. `getInfoRequest`
+
+    def build(self, payload: Union[dict, str, Message, None] = None) -> Union[KaspadMessage, bytes]:
+        if not payload:
+            return self.empty_bytes
+        kaspa_msg = KaspadMessage()
+        app_msg = getattr(kaspa_msg, self.name)
+        if isinstance(payload, dict):
+            json_format.ParseDict(payload, app_msg)
+        elif isinstance(payload, str):
+            json_format.Parse(payload, app_msg)
+        elif isinstance(payload, self.message_class):
+            app_msg.CopyFrom(payload)
+        else:
+            raise TypeError(f'cannot build {self.name} from payload of type {type(payload).__name__}')
+        app_msg.SetInParent()
+        return kaspa_msg
+
+    @staticmethod
+    def _field_or_none(name: str) -> Union[str, None]:
+        return name if name in _KASPADMESSAGE.fields_by_name else None
+
+    @staticmethod
+    def _notifications_of(response: Union[str, None]) -> tuple:
+        '''notifications directly follow the response of their notify command, i.e. `notifyFinalityConflictsResponse` has two'''
+        if response is None:
+            return ()
+        fields = sorted(_KASPADMESSAGE.fields, key=lambda field: field.number)
+        notifications = []
+        for field in fields[fields.index(_KASPADMESSAGE.fields_by_name[response]) + 1:]:
+            if not field.name.endswith('Notification'):
+                break
+            notifications.append(field.name)
+        return tuple(notifications)
+
+    def __str__(self) -> str:
+        return self.name
+
+
+COMMANDS: Dict[str, Command] = {field.name : Command(field) for field in _KASPADMESSAGE.fields}
+
+
+def serialize_request(request: Union[KaspadMessage, bytes]) -> bytes:
+    '''request serializer for the message stream, lets pre-serialized requests pass through'''
+    return request if isinstance(request, bytes) else request.SerializeToString()
@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import namedtuple
+from logging import getLogger
+from typing import Dict, Iterable, List, Tuple, Union
+
+from kaspy.dispatchers import PoolDispatcher
+from kaspy.defines import CLOSED
+from kaspy.excepts.exceptions import RPCResponseException
+
+LOG = getLogger('[KASPA_UTX]')
+
+Utxo = namedtuple('Utxo', ('transaction_id', 'index', 'address', 'amount', 'block_daa_score', 'is_coinbase', 'script_public_key'))
+
+
+class UtxoIndex:
+    '''local index of the utxos of `addresses`, bootstrapped from `getUtxosByAddressesRequest` and kept up to date
+    with `utxosChangedNotification`s, so `balance` and `utxos` are answered without a round trip.
+
+    utxos are kept by outpoint, with the outpoints and balance of each address aggregated alongside. all changes are applied
+    by the single worker of the subscription's dispatcher, in the order they arrived. when the message stream of the client
+    was reopened, or replaced, notifications may have been missed, so the index is rebuilt from a new snapshot; notifications
+    arriving meanwhile queue up behind the rebuild, and are applied on top of it.
+
+    a client holds one subscription per command, so use one index per client'''
+
+    def __init__(self, client, addresses: Iterable[str], check_interval: float = 5, timeout: Union[float, None] = 30) -> None:
+        self.client = client
+        self.addresses = list(addresses)
+        self.resyncs = 0 # snapshots taken, including the bootstrap
+        self._check_interval = check_interval
+        self._timeout = timeout
+        self._utxos = {} # (transaction id, index) -> Utxo
+        self._outpoints = {address: set() for address in self.addresses}
+        self._balances = dict.fromkeys(self.addresses, 0)
+        self._stream_state = None # (stream, generation) the index is consistent with
+        self._dispatcher = PoolDispatcher(workers=1, maxsize=0) # unbounded, the stream must not wait on a rebuild
+        self._synced = threading.Event() # set while the index is consistent with a snapshot of the current stream
+        self._error = None # of the last failed snapshot
+        self._closed = False
+
+    def start(self) -> 'UtxoIndex':
+        '''subscribes, then takes the first snapshot, returns once it is applied.
+
+        raises the error of the snapshot, or `TimeoutError` if none was applied within `timeout`, and closes the index'''
+        self.client.subscribe('notifyUtxosChangedRequest', self._on_notification, {'addresses': self.addresses},
+                              raw=True, dispatcher=self._dispatcher)
+        self._dispatcher.dispatch(self._resync, None)
+        if not self._synced.wait(self._timeout):
+            self.close()
+            raise self._error or TimeoutError(f'no utxo snapshot of {len(self.addresses)} addresses within {self._timeout} seconds')
+        threading.Thread(target=self._watch, daemon=True).start()
+        return self
+
+    def close(self):
+        self._closed = True
+        try:
+            self.client.unsubscribe('notifyUtxosChangedRequest')
+        except Exception as e:
+            LOG.debug(e)
+
+    # lookups
+
+    def balance(self, address: str) -> int:
+        return self._balances.get(address, 0)
+
+    def utxos(self, address: str) -> List[Utxo]:
+        utxos = self._utxos
+        return [utxos[outpoint] for outpoint in tuple(self._outpoints.get(address, ()))]
+
+    def get(self, transaction_id: str, index: int) -> Union[Utxo, None]:
+        return self._utxos.get((transaction_id, index))
+
+    @property
+    def synced(self) -> bool:
+        '''False while a snapshot is due, i.e. after the stream was reopened, lookups may be stale meanwhile'''
+        return self._synced.is_set()
+
+    @property
+    def balances(self) -> Dict[str, int]:
+        return dict(self._balances)
+
+    def __len__(self) -> int:
+        return len(self._utxos)
+
+    # consistency
+
+    def _current_stream_state(self) -> Tuple[object, int]:
+        stream = getattr(self.client, 'members', [self.client])[0].request_stream # a pool subscribes on its primary member
+        return stream, getattr(stream, 'generation', 0)
+
+    def _watch(self):
+        '''notices a reopened or replaced stream even when no notifications arrive'''
+        while not self._closed and self.client.client_status != CLOSED:
+            time.sleep(self._check_interval)
+            if not self._synced.is_set() or self._stream_state != self._current_stream_state():
+                self._dispatcher.dispatch(self._resync, None)
+
+    def _resync(self, _=None):
+        if self._closed:
+            return None
+        state = self._current_stream_state()
+        if self._synced.is_set() and state == self._stream_state: # already rebuilt for this stream
+            return None
+        try:
+            resp = self.client.request('getUtxosByAddressesRequest', {'addresses': self.addresses}, timeout=self._timeout, raw=True)
+            if resp.getUtxosByAddressesResponse.error.message:
+                raise RPCResponseException(self.client.node, 'getUtxosByAddressesRequest', resp.getUtxosByAddressesResponse.error.message)
+        except Exception as e: # retried by the watcher, or with the next notification
+            LOG.debug(e)
+            self._error = e
+            self._synced.clear() # the index may have missed notifications, if the stream changed
+            return None
+        utxos, outpoints, balances = {}, {address: set() for address in self.addresses}, dict.fromkeys(self.addresses, 0)
+        for entry in resp.getUtxosByAddressesResponse.entries:
+            self._add(entry, utxos, outpoints, balances)
+        self._utxos, self._outpoints, self._balances = utxos, outpoints, balances
+        self._stream_state = state
+        self._error = None
+        self.resyncs += 1
+        self._synced.set()
+
+    # changes
+
+    def _on_notification(self, notification):
+        if not self._synced.is_set() or self._stream_state != self._current_stream_state():
+            self._resync()
+        if not self._synced.is_set(): # no snapshot to apply the changes to, the next one includes them
+            return None
+        changes = notification.utxosChangedNotification
+        for entry in changes.removed:
+            self._remove(entry)
+        for entry in changes.added:
+            self._add(entry, self._utxos, self._outpoints, self._balances)
+
+    @staticmethod
+    def _add(entry, utxos: dict, outpoints: dict, balances: dict):
+        outpoint = (entry.outpoint.transactionId, entry.outpoint.index)
+        if outpoint in utxos: # replayed on top of a snapshot
+            return None
+        utxo = entry.utxoEntry
+        utxos[outpoint] = Utxo(outpoint[0], outpoint[1], entry.address, utxo.amount, utxo.blockDaaScore, utxo.isCoinbase,
+                               utxo.scriptPublicKey.scriptPublicKey)
+        outpoints.setdefault(entry.address, set()).add(outpoint)
+        balances[entry.address] = balances.get(entry.address, 0) + utxo.amount
+
+    def _remove(self, entry):
+        utxo = self._utxos.pop((entry.outpoint.transactionId, entry.outpoint.index), None)
+        if utxo is None:
+            return None
+        self._outpoints[utxo.address].discard((utxo.transaction_id, utxo.index))
+        self._balances[utxo.address] -= utxo.amount
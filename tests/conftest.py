@@ -0,0 +1,18 @@
+import pytest
+
+from kaspy.kaspa_clients import RPCClient
+from kaspy.testing import MockKaspad
+
+
+@pytest.fixture
+def kaspad():
+    with MockKaspad() as kaspad:
+        yield kaspad
+
+
+@pytest.fixture
+def client(kaspad):
+    client = RPCClient()
+    client.connect(kaspad.host, kaspad.port)
+    yield client
+    client.close()
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+import kaspy.async_kaspa_clients as async_clients
+from kaspy.async_kaspa_clients import AsyncRPCClient
+from kaspy.defines import MAINNET
+from kaspy.excepts.exceptions import NoNodeAvailable
+from kaspy.network.node import node_acquirer
+from kaspy.testing import MockKaspad
+
+# the seeds are ip addresses, so the real discovery resolves them without dns
+
+
+@pytest.fixture
+def kaspad(monkeypatch):
+    with MockKaspad(host='127.0.0.2') as kaspad:
+        monkeypatch.setattr(async_clients, 'RPC_DEF_PORTS', {MAINNET: kaspad.port})
+        yield kaspad
+
+
+def test_auto_connect_skips_unreachable_nodes(kaspad, monkeypatch):
+    monkeypatch.setattr(node_acquirer, 'dns_seed_servers', ['127.0.0.4', '127.0.0.2']) # nothing listens on 127.0.0.4
+    async def connect():
+        client = AsyncRPCClient()
+        await client.auto_connect(conn_timeout=2)
+        node = client.node.ip
+        await client.close()
+        return node
+    assert asyncio.run(connect()) == '127.0.0.2'
+
+
+def test_auto_connect_raises_after_one_scan(kaspad, monkeypatch):
+    monkeypatch.setattr(node_acquirer, 'dns_seed_servers', ['127.0.0.4', '127.0.0.3'])
+    with MockKaspad(host='127.0.0.3', port=kaspad.port) as testnet: # answers, but fails the network check
+        testnet.respond('getCurrentNetworkRequest', {'currentNetwork': 'testnet'})
+        with pytest.raises(NoNodeAvailable):
+            asyncio.run(asyncio.wait_for(AsyncRPCClient().auto_connect(conn_timeout=2), 30))
+        assert testnet.requests['getCurrentNetworkRequest'] == 1
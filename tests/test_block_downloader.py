@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+from kaspy.block_downloader import BlockDownloader
+from kaspy.kaspa_clients import RPCClient, RPCClientPool
+from kaspy.testing import MockKaspad
+
+
+@pytest.fixture
+def kaspad():
+    with MockKaspad(chain_length=250, page_size=50) as kaspad:
+        yield kaspad
+
+
+def _ranges(kaspad: MockKaspad, delay: float = 0, padding: int = 0) -> dict:
+    '''answers getBlocksRequest like the mock, counts the ranges, their low hashes, and how many were served at once'''
+    counts = {'ranges': 0, 'low_hashes': set(), 'concurrent': 0, 'max_concurrent': 0}
+    lock = threading.Lock()
+    def blocks(request):
+        resp = kaspad._blocks(request)
+        if not request.includeBlocks:
+            return resp
+        with lock:
+            counts['ranges'] += 1
+            counts['low_hashes'].add(request.lowHash)
+            counts['concurrent'] += 1
+            counts['max_concurrent'] = max(counts['max_concurrent'], counts['concurrent'])
+        time.sleep(delay)
+        with lock:
+            counts['concurrent'] -= 1
+        for block in resp['blocks']:
+            block['transactions'][0]['payload'] = '00' * padding
+        return resp
+    kaspad.respond('getBlocksRequest', blocks)
+    return counts
+
+
+def test_downloads_ranges_in_order(kaspad, client, tmp_path):
+    path = str(tmp_path / 'blocks.bin')
+    downloaded = BlockDownloader(client, low_hash=kaspad.chain[0], sink=path, checkpoint=str(tmp_path / 'blocks.json')).run()
+    assert downloaded == 249
+    assert [block.verboseData.hash for block in BlockDownloader.read_file(path)] == kaspad.chain[1:]
+    assert kaspad.requests['getBlockRequest'] == 0
+
+
+def test_blocks_are_fetched_one_by_one_once_a_range_does_not_fit(kaspad, tmp_path):
+    counts = _ranges(kaspad, padding=2048)
+    client = RPCClient()
+    client.connect(kaspad.host, kaspad.port, max_receive_size=64 * 1024)
+    delivered = []
+    downloader = BlockDownloader(client, low_hash=kaspad.chain[0], sink=lambda block_hash, block: delivered.append(block_hash), window=32)
+    downloader.run()
+    client.close()
+    assert delivered == kaspad.chain[1:]
+    assert not downloader.ranges and counts['low_hashes'] == {kaspad.chain[0]} # only the first range was tried
+    assert kaspad.requests['getBlockRequest'] == 249
+
+
+def test_ranges_are_spread_over_a_pool(kaspad):
+    counts = _ranges(kaspad, delay=0.2)
+    pool = RPCClientPool(size=4, nodes=[f'{kaspad.host}:{kaspad.port}'])
+    delivered = []
+    downloader = BlockDownloader(pool, low_hash=kaspad.chain[0], sink=lambda block_hash, block: delivered.append(block_hash))
+    downloader.run()
+    pool.close()
+    assert delivered == kaspad.chain[1:]
+    assert counts['ranges'] == downloader.pages and counts['max_concurrent'] > 1
@@ -0,0 +1,69 @@
+import threading
+
+import grpc
+import pytest
+
+from kaspy.block_store import BlockStore
+from kaspy.kaspa_clients import RPCClient
+from kaspy.protos.rpc_pb2 import RpcBlock
+
+
+def _block(height: int, transactions: bool = True) -> RpcBlock:
+    block = RpcBlock()
+    block.verboseData.hash = '%064x' % height
+    block.header.daaScore = height
+    if transactions:
+        block.transactions.add().version = 0
+    return block
+
+
+def test_reopened_store_serves_blocks_from_disk(tmp_path):
+    path = str(tmp_path / 'blocks')
+    store = BlockStore(path, memory_size=2)
+    for height in range(1, 6):
+        store.put(_block(height))
+    store.close()
+    store = BlockStore(path, memory_size=2)
+    assert len(store) == 5
+    assert store.get('%064x' % 1).header.daaScore == 1
+    assert store.stats['disk'] == 5 and store.stats['memory'] == 1
+    store.close()
+
+
+def test_header_only_blocks_do_not_serve_transactions():
+    store = BlockStore()
+    block_hash = '%064x' % 1
+    store.put(_block(1, transactions=False), with_transactions=False)
+    assert store.get(block_hash, include_transactions=True) is None
+    assert store.get(block_hash, include_transactions=False) is not None
+    store.put(_block(1))
+    assert len(store.get(block_hash, include_transactions=True).transactions) == 1
+    assert len(store.get(block_hash, include_transactions=False).transactions) == 0
+
+
+def test_page_served_by_a_store_smaller_than_the_page(kaspad, client):
+    client.block_store = BlockStore(memory_size=60)
+    for height in range(1, 61): # most of the first page is held, storing the rest evicts it again
+        client.block_store.put(_block(height))
+    resp = client.request('getBlocksRequest', {'lowHash': kaspad.chain[0], 'includeBlocks': True, 'includeTransactions': True}, timeout=10)
+    blocks = resp['getBlocksResponse']['blocks']
+    assert [block['verboseData']['hash'] for block in blocks] == kaspad.chain[:100]
+    assert kaspad.requests['getBlockRequest'] == 40
+
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning') # the failed stream's reader ends on the error
+def test_concurrent_failures_reconnect_once(kaspad):
+    client = RPCClient()
+    client.connect(kaspad.host, kaspad.port, retry_count=3)
+    kaspad.latency = 0.2
+    kaspad.fail('getBlockDagInfoRequest', status=grpc.StatusCode.UNAVAILABLE, times=1)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.request('getBlockDagInfoRequest', timeout=10))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert len(results) == 8
+    assert client._connections == 2
+    assert kaspad.requests['getInfoRequest'] == 1 # the check of the one reconnect
+    client.close()
@@ -0,0 +1,47 @@
+from itertools import islice
+
+import pytest
+
+from kaspy.chain_follower import ChainFollower
+from kaspy.defines import CHAIN_ADDED, CHAIN_REMOVED
+from kaspy.kaspa_clients import RPCClient
+from kaspy.testing import MockKaspad
+
+
+@pytest.fixture
+def kaspad():
+    with MockKaspad(chain_length=250, page_size=100) as kaspad:
+        yield kaspad
+
+
+def _follow(follower: ChainFollower, count: int) -> list:
+    events = iter(follower)
+    taken = list(islice(events, count))
+    follower.close()
+    events.close()
+    return taken
+
+
+def test_follows_the_chain_from_the_pruning_point(kaspad, client):
+    events = _follow(ChainFollower(client, include_accepted_transaction_ids=True, notify=False, poll_interval=0.05), 249)
+    assert [event.hash for event in events] == kaspad.chain[1:]
+    assert all(event.kind == CHAIN_ADDED and event.accepted_transaction_ids == (event.hash,) for event in events)
+
+
+def test_resumes_from_the_checkpoint(kaspad, client, tmp_path):
+    checkpoint = str(tmp_path / 'chain.json')
+    _follow(ChainFollower(client, checkpoint=checkpoint, notify=False), 150) # the second page is in progress
+    follower = ChainFollower(client, checkpoint=checkpoint, notify=False)
+    events = _follow(follower, 1)
+    assert events[0].hash == kaspad.chain[101]
+
+
+def test_continues_from_the_fork_point_after_a_removed_only_page(kaspad, client):
+    reorged = kaspad.chain[9]
+    def chain_from_block(request):
+        if request.startHash == reorged and kaspad.requests['getVirtualSelectedParentChainFromBlockRequest'] == 1:
+            return {'removedChainBlockHashes': [reorged]}
+        return kaspad._chain_from_block(request)
+    kaspad.respond('getVirtualSelectedParentChainFromBlockRequest', chain_from_block)
+    events = _follow(ChainFollower(client, start_hash=reorged, notify=False), 3)
+    assert events == [(CHAIN_REMOVED, reorged, ()), (CHAIN_ADDED, kaspad.chain[9], ()), (CHAIN_ADDED, kaspad.chain[10], ())]
@@ -0,0 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+def test_concurrent_requests_get_their_own_responses(client):
+    hashes = ['%064x' % height for height in range(1, 401)]
+    def get_block(block_hash):
+        resp = client.request('getBlockRequest', {'hash': block_hash}, timeout=10, raw=True)
+        return resp.getBlockResponse.block.verboseData.hash
+    with ThreadPoolExecutor(16) as pool:
+        assert list(pool.map(get_block, hashes)) == hashes
+
+
+def test_late_response_of_timed_out_request_is_discarded(kaspad, client):
+    kaspad.latency = lambda command: 0.5 if command == 'getBlockDagInfoRequest' else 0
+    with pytest.raises(TimeoutError):
+        client.request('getBlockDagInfoRequest', timeout=0.1)
+    assert client.request_stream.in_flight == 0
+    kaspad.latency = 0
+    assert 'getBlockDagInfoResponse' in client.request('getBlockDagInfoRequest', timeout=5)
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from kaspy.defines import BLOCK, DROP_OLDEST, RAISE
+from kaspy.dispatchers import BatchingDispatcher, InlineDispatcher, KeyedPoolDispatcher, PoolDispatcher
+from kaspy.excepts.exceptions import DispatchQueueFull
+
+
+def _held(dispatcher, count, release):
+    '''dispatches `count` notifications while the worker is held on the first one'''
+    received = []
+    def callback(notification):
+        release.wait(5)
+        received.append(notification)
+    for notification in range(count):
+        dispatcher.dispatch(callback, notification)
+    return received
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_drop_oldest_keeps_the_newest():
+    release = threading.Event()
+    dispatcher = PoolDispatcher(maxsize=4, overflow=DROP_OLDEST)
+    received = _held(dispatcher, 10, release)
+    release.set()
+    _wait_for(lambda: len(received) == 10 - dispatcher.dropped)
+    assert dispatcher.dropped > 0
+    assert received[-4:] == [6, 7, 8, 9]
+    dispatcher.close()
+
+
+def test_raise_reports_instead_of_raising():
+    release = threading.Event()
+    errors = []
+    dispatcher = PoolDispatcher(maxsize=4, overflow=RAISE, on_error=errors.append)
+    received = _held(dispatcher, 10, release) # must not raise in the caller, the stream's reader thread
+    release.set()
+    _wait_for(lambda: len(received) == 10 - dispatcher.errors)
+    assert dispatcher.errors == len(errors) == 10 - len(received)
+    assert errors and all(isinstance(error, DispatchQueueFull) for error in errors)
+    dispatcher.close()
+
+
+def test_block_waits_for_room():
+    release = threading.Event()
+    dispatcher = PoolDispatcher(maxsize=2, overflow=BLOCK)
+    dispatching = threading.Thread(target=_held, args=(dispatcher, 10, release), daemon=True)
+    dispatching.start()
+    dispatching.join(0.2)
+    assert dispatching.is_alive() # held back by the full queue
+    release.set()
+    dispatching.join(5)
+    assert not dispatching.is_alive()
+    dispatcher.close()
+
+
+def test_failing_key_is_reported():
+    errors = []
+    dispatcher = KeyedPoolDispatcher(key=lambda notification: 1 / 0, on_error=errors.append)
+    dispatcher.dispatch(lambda _: None, {})
+    assert dispatcher.errors == 1 and isinstance(errors[0], ZeroDivisionError)
+    dispatcher.close()
+
+
+def test_unknown_overflow_policy_is_rejected():
+    with pytest.raises(ValueError):
+        PoolDispatcher(overflow='drop_newest')
+    with pytest.raises(ValueError):
+        BatchingDispatcher(batch_size=None, max_delay=None)
+
+
+def test_batches_are_kept_per_callback():
+    first, second = [], []
+    dispatcher = BatchingDispatcher(batch_size=3, max_delay=None, dispatcher=InlineDispatcher())
+    for notification in range(6):
+        dispatcher.dispatch(first.append, ('first', notification))
+        dispatcher.dispatch(second.append, ('second', notification))
+    _wait_for(lambda: len(first) == len(second) == 2)
+    assert all(kind == 'first' for batch in first for kind, _ in batch)
+    assert all(kind == 'second' for batch in second for kind, _ in batch)
+    dispatcher.close()
+
+
+def test_leftovers_are_due_max_delay_after_they_arrived():
+    release = threading.Event()
+    delivered = []
+    def callback(batch):
+        if not delivered:
+            release.wait(5) # holds the flusher on the first batch, while the next ones arrive
+        delivered.append((time.monotonic(), len(batch)))
+    dispatcher = BatchingDispatcher(batch_size=10, max_delay=0.5, dispatcher=InlineDispatcher())
+    for notification in range(10):
+        dispatcher.dispatch(callback, notification)
+    time.sleep(0.05)
+    arrived = time.monotonic()
+    for notification in range(15):
+        dispatcher.dispatch(callback, notification)
+    time.sleep(0.3)
+    release.set() # a full batch of 10 goes now, the 5 left over are due 0.5 seconds after they arrived
+    _wait_for(lambda: len(delivered) == 3)
+    assert [size for _, size in delivered] == [10, 10, 5]
+    assert delivered[2][0] - arrived < 0.7
+    dispatcher.close()
+
+
+@pytest.mark.parametrize('overflow', [DROP_OLDEST, RAISE])
+def test_batch_buffer_is_bounded(overflow):
+    release = threading.Event()
+    errors = []
+    dispatcher = BatchingDispatcher(batch_size=1, max_delay=None, dispatcher=InlineDispatcher(), maxsize=5, overflow=overflow,
+                                    on_error=errors.append)
+    for notification in range(50):
+        dispatcher.dispatch(lambda batch: release.wait(5), notification) # the flusher is stuck on the first batch
+        assert dispatcher.queue_depth <= 5
+    assert (dispatcher.dropped if overflow == DROP_OLDEST else dispatcher.errors) >= 40
+    assert len(errors) == dispatcher.errors
+    release.set()
+    dispatcher.close()
@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from kaspy.defines import BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN
+from kaspy.excepts.exceptions import CircuitOpen
+from kaspy.health import CircuitBreaker, HealthMonitor
+
+
+def test_breaker_trips_on_error_rate():
+    breaker = CircuitBreaker(failure_rate=0.5, window=10, min_samples=4, reset_timeout=60)
+    for ok in (True, False, True):
+        breaker.record(ok)
+    assert breaker.state == BREAKER_CLOSED # too few samples
+    breaker.record(False)
+    assert breaker.state == BREAKER_OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = CircuitBreaker(reset_timeout=0.05)
+    breaker.trip('test')
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == BREAKER_HALF_OPEN
+    assert not breaker.allow() # the trial is in flight
+    breaker.record(False)
+    assert breaker.state == BREAKER_OPEN
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == BREAKER_CLOSED and breaker.reason is None
+
+
+def test_monitor_rejects_requests_to_an_unsynced_node(kaspad, client):
+    monitor = HealthMonitor(interval=60, reset_timeout=60)
+    monitor.watch(client)
+    try:
+        monitor.probe(client)
+        assert monitor.health(client.node).synced is True
+        assert monitor.health(client.node).latency is not None
+        kaspad.respond('getInfoRequest', {'serverVersion': '0.12.11', 'isSynced': False})
+        monitor.probe(client)
+        with pytest.raises(CircuitOpen):
+            client.request('getBlockDagInfoRequest', timeout=5)
+        assert monitor.score(client.node) == float('inf')
+    finally:
+        monitor.close()
+        monitor.unwatch(client)
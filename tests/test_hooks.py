@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from kaspy.hooks import HOOKS
+
+
+@pytest.fixture
+def hooks():
+    yield HOOKS
+    HOOKS.clear()
+
+
+def test_request_events_share_the_request(hooks, client):
+    events = []
+    hooks.register('pre_send', lambda node, command, request: events.append(('pre_send', command, request)))
+    hooks.register('post_send', lambda node, command, request: events.append(('post_send', command, request)))
+    hooks.register('response_received', lambda node, command, request, response: events.append(('response_received', command, request)))
+    client.request('getInfoRequest', timeout=5)
+    assert [event[:2] for event in events] == [('pre_send', 'getInfoRequest'), ('post_send', 'getInfoRequest'),
+                                               ('response_received', 'getInfoRequest')]
+    assert len({id(event[2]) for event in events}) == 1
+
+
+def test_failing_hooks_do_not_fail_the_client(hooks, client):
+    def failing(*args):
+        raise RuntimeError('hook failed')
+    hooks.register('pre_send', failing)
+    assert client.request('getInfoRequest', timeout=5)['getInfoResponse']
+    hooks.unregister('pre_send', failing)
+    assert hooks.pre_send == ()
+
+
+def test_callback_events(hooks, kaspad, client):
+    ended = []
+    hooks.register('callback_end', lambda command, notification, seconds, error: ended.append((command, error)))
+    kaspad.notification_count = 1
+    client.subscribe('notifyBlockAddedRequest', lambda notification: 1 / 0)
+    deadline = time.monotonic() + 10
+    while not ended:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert ended[0][0] == 'notifyBlockAddedRequest' and isinstance(ended[0][1], ZeroDivisionError)
+
+
+def test_unknown_events_are_rejected(hooks):
+    with pytest.raises(ValueError):
+        hooks.register('pre_sned', print)
+    with pytest.raises(ValueError):
+        hooks.unregister('pre_sned', print)
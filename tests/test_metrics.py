@@ -0,0 +1,41 @@
+import time
+
+from kaspy.metrics import Histogram, RateCounter, prometheus_text
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram((1, 2, 5))
+    for value in (0.5, 1, 1.5, 4, 10):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot['buckets'] == [[1, 2], [2, 3], [5, 4], ['+Inf', 5]]
+    assert snapshot['count'] == 5 and snapshot['sum'] == 17
+    assert histogram.quantile(0.5) == 2 and histogram.quantile(0.99) == float('inf')
+    assert Histogram((1,)).quantile(0.5) is None
+
+
+def test_rate_counter():
+    counter = RateCounter(window=10)
+    counter.add(20)
+    counter.add(10)
+    assert counter.total == 30 and counter.rate == 3.0
+
+
+def test_client_records_requests_and_notifications(kaspad, client):
+    metrics = client.enable_metrics()
+    kaspad.notification_rate, kaspad.notification_count = 100, 5
+    client.subscribe('notifyBlockAddedRequest', lambda notification: None)
+    for _ in range(3):
+        client.request('getInfoRequest', timeout=5)
+    deadline = time.monotonic() + 10
+    while metrics.notifications.get('blockAddedNotification') is None or metrics.notifications['blockAddedNotification'].total < 5:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    stats = client.stats()
+    assert stats['histograms']['round_trip_seconds']['getInfoRequest']['count'] == 3
+    assert stats['histograms']['decode_seconds']['blockAddedNotification']['count'] == 5
+    assert stats['histograms']['to_dict_seconds']['blockAddedNotification']['count'] == 5
+    text = prometheus_text(stats)
+    assert f'kaspy_round_trip_seconds_count{{node="{client.node}",command="getInfoRequest"}} 3' in text
+    assert f'kaspy_notifications_total{{node="{client.node}",notification="blockAddedNotification"}} 5' in text
+    assert '# TYPE kaspy_queue_depth gauge' in text
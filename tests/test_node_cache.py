@@ -0,0 +1,59 @@
+import time
+
+from kaspy.kaspa_clients import RPCClient
+from kaspy.network.node import Node, node_acquirer
+from kaspy.network.node_cache import NodeCache
+from kaspy.utils.version_comparer import version as ver
+
+
+def _node(ip: str, port: int = 16110, latency: float = 0.1, version: str = '0.12.0', network: str = 'kaspa-mainnet') -> Node:
+    node = Node(ip, port)
+    node.last_latency = latency
+    node.version = ver.parse_from_string(version)
+    node.network = network
+    node.utxoindex = True
+    return node
+
+
+def test_ranked_best_latency_first_and_filtered(tmp_path):
+    cache = NodeCache(str(tmp_path / 'nodes.json'))
+    cache.record_success(_node('10.0.0.1', latency=0.3))
+    cache.record_success(_node('10.0.0.2', latency=0.1))
+    cache.record_success(_node('10.0.0.3', latency=0.2, version='0.11.0'))
+    cache.record_success(_node('10.0.0.4', network='kaspa-testnet'))
+    ranked = cache.ranked(16110, 'kaspa-mainnet', min_kaspad_version='0.12.0')
+    assert [node.ip for node in ranked] == ['10.0.0.2', '10.0.0.1']
+    assert ranked[0].last_latency == 0.1 and ranked[0].utxoindex is True
+
+
+def test_failures_and_age_drop_nodes(tmp_path):
+    cache = NodeCache(str(tmp_path / 'nodes.json'), max_age=60, max_failures=2)
+    failing, stale = _node('10.0.0.1'), _node('10.0.0.2')
+    cache.record_success(failing)
+    cache.record_success(stale)
+    cache.record_failure(failing)
+    assert len(cache.ranked()) == 2
+    cache.record_failure(failing)
+    cache._entries[str(stale)]['last_success'] = time.time() - 61
+    assert cache.ranked() == []
+    cache.record_success(failing) # answering again resets its failures
+    assert [node.ip for node in cache.ranked()] == ['10.0.0.1']
+
+
+def test_saved_and_loaded(tmp_path):
+    path = str(tmp_path / 'nodes.json')
+    cache = NodeCache(path)
+    cache.record_success(_node('10.0.0.1'))
+    assert [str(node) for node in NodeCache(path).ranked()] == ['10.0.0.1:16110']
+    (tmp_path / 'nodes.json').write_text('{not json')
+    assert len(NodeCache(path)) == 0
+
+
+def test_refresh_stops_after_one_scan(kaspad, tmp_path, monkeypatch):
+    monkeypatch.setattr(node_acquirer, 'dns_seed_servers', ['127.0.0.4', kaspad.host]) # nothing listens on 127.0.0.4
+    cache = NodeCache(str(tmp_path / 'nodes.json'))
+    refresh = RPCClient._refresh_node_cache(cache, kaspad.port, 2, count=8) # fewer nodes than asked for
+    refresh.join(30)
+    assert not refresh.is_alive()
+    assert [str(node) for node in cache.ranked()] == [f'{kaspad.host}:{kaspad.port}']
+    assert RPCClient._refresh_node_cache(cache, kaspad.port, 2) is None # once per cache
@@ -0,0 +1,31 @@
+import time
+
+import pytest
+
+
+def test_stream_yields_notifications(kaspad, client):
+    kaspad.notification_rate = None
+    with client.stream('notifyBlockAddedRequest', maxsize=10) as notifications:
+        received = [next(notifications) for _ in range(25)]
+    assert all('blockAddedNotification' in notification for notification in received)
+
+
+def test_stream_holds_back_the_node_while_full(kaspad, client):
+    kaspad.notification_rate = None
+    with client.stream('notifyBlockAddedRequest', maxsize=10) as notifications:
+        time.sleep(0.3)
+        assert notifications.queue_depth == 10
+
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning') # the request stream ends with the dropped connection
+def test_closed_streams_are_forgotten(kaspad, client):
+    first = client.stream('notifyBlockAddedRequest')
+    second = client.stream('notifyVirtualDaaScoreChangedRequest')
+    first.close()
+    assert client._notification_streams == [second]
+    next(second) # open
+    kaspad.drop_streams() # a stream ending on its own is forgotten too
+    deadline = time.monotonic() + 5
+    while client._notification_streams and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client._notification_streams == []
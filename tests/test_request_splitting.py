@@ -0,0 +1,62 @@
+import time
+
+import grpc
+import pytest
+
+from kaspy.kaspa_clients import RPCClient
+
+
+@pytest.fixture
+def small_client(kaspad):
+    client = RPCClient()
+    client.connect(kaspad.host, kaspad.port, max_receive_size=64 * 1024)
+    yield client
+    client.close()
+
+
+def test_resource_exhausted_fails_only_the_oversized_request(kaspad, small_client):
+    kaspad.latency = 0.02
+    kaspad.oversize('getBlockDagInfoRequest', 128 * 1024)
+    stream = small_client.request_stream
+    oversized = stream.submit('getBlockDagInfoRequest')
+    others = [stream.submit('getInfoRequest') for _ in range(5)]
+    with pytest.raises(grpc.RpcError) as e:
+        oversized.result(10)
+    assert e.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert [future.result(10).WhichOneof('payload') for future in others] == ['getInfoResponse'] * 5
+    assert stream.generation == 3 # reopened once with all of them in flight, and once with the oversized one alone
+
+
+def test_oversized_notification_fails_no_request(kaspad, small_client):
+    kaspad.latency = lambda command: 0.5 if command == 'getBlockDagInfoRequest' else 0
+    small_client.subscribe('notifyBlockAddedRequest', lambda notification: None)
+    slow = small_client.request_stream.submit('getBlockDagInfoRequest')
+    time.sleep(0.1)
+    kaspad.oversize('blockAddedNotification', 128 * 1024, times=1)
+    assert slow.result(10).WhichOneof('payload') == 'getBlockDagInfoResponse'
+
+
+def test_non_idempotent_requests_are_not_sent_again(kaspad, small_client):
+    kaspad.latency = 0.05
+    kaspad.oversize('getBlockDagInfoRequest', 128 * 1024)
+    stream = small_client.request_stream
+    oversized = stream.submit('getBlockDagInfoRequest')
+    submitted = stream.submit('submitTransactionRequest', {'transaction': {'version': 0}})
+    utxos = stream.submit('getUtxosByAddressesRequest', {'addresses': ['kaspa:mock']})
+    with pytest.raises(grpc.RpcError):
+        submitted.result(10)
+    with pytest.raises(grpc.RpcError):
+        oversized.result(10)
+    assert utxos.result(10).WhichOneof('payload') == 'getUtxosByAddressesResponse' # not blamed, so not split
+    assert kaspad.requests['submitTransactionRequest'] <= 1
+
+
+def test_resource_exhausted_splits_splittable_requests(kaspad):
+    client = RPCClient()
+    client.connect(kaspad.host, kaspad.port, max_receive_size=16 * 1024)
+    kaspad.utxos_per_address = 20
+    addresses = [f'kaspa:mock{index}' for index in range(40)]
+    resp = client.request('getUtxosByAddressesRequest', {'addresses': addresses}, timeout=10)
+    assert len(resp['getUtxosByAddressesResponse']['entries']) == 20 * 40
+    assert kaspad.requests['getUtxosByAddressesRequest'] > 1
+    client.close()
@@ -0,0 +1,73 @@
+import time
+
+import grpc
+import pytest
+
+from kaspy.defines import CACHE_FOREVER
+from kaspy.kaspa_clients import RPCClient
+from kaspy.protos.messages_pb2 import KaspadMessage
+from kaspy.response_cache import ResponseCache
+
+
+def _info(version: str = '0.12.11', error: str = '') -> KaspadMessage:
+    message = KaspadMessage()
+    message.getInfoResponse.serverVersion = version
+    message.getInfoResponse.error.message = error
+    return message
+
+
+def test_expires_after_ttl():
+    cache = ResponseCache(ttls={'getInfoRequest': 0.05})
+    key = cache.key('10.0.0.1:16110', 'getInfoRequest', None)
+    cache.put(key, _info())
+    assert cache.get(key).getInfoResponse.serverVersion == '0.12.11'
+    time.sleep(0.06)
+    assert cache.get(key) is None
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1 and len(cache) == 0
+
+
+def test_evicts_least_recently_used():
+    cache = ResponseCache(maxsize=2, ttls={'getInfoRequest': 60})
+    first, second, third = (cache.key(f'10.0.0.{index}:16110', 'getInfoRequest', None) for index in range(3))
+    cache.put(first, _info())
+    cache.put(second, _info())
+    cache.get(first)
+    cache.put(third, _info())
+    assert cache.get(second) is None
+    assert cache.get(first) is not None and cache.get(third) is not None
+
+
+def test_keys_by_node_unless_content_addressed():
+    cache = ResponseCache(ttls={'getInfoRequest': 60, 'getBlockRequest': CACHE_FOREVER})
+    assert cache.key('10.0.0.1:16110', 'getInfoRequest', None) != cache.key('10.0.0.2:16110', 'getInfoRequest', None)
+    payload = {'hash': 'ab' * 32, 'includeTransactions': True}
+    assert cache.key('10.0.0.1:16110', 'getBlockRequest', payload) == cache.key('10.0.0.2:16110', 'getBlockRequest', payload)
+    assert cache.key('10.0.0.1:16110', 'getBlockDagInfoRequest', None) is None
+
+
+def test_errors_are_not_cached():
+    cache = ResponseCache(ttls={'getInfoRequest': 60})
+    key = cache.key('10.0.0.1:16110', 'getInfoRequest', None)
+    cache.put(key, _info(error='not synced'))
+    assert len(cache) == 0
+
+
+def test_client_serves_cached_responses(kaspad, client):
+    client.response_cache = ResponseCache()
+    for _ in range(3):
+        assert client.request('getCurrentNetworkRequest', timeout=5)['getCurrentNetworkResponse']['currentNetwork']
+    assert kaspad.requests['getCurrentNetworkRequest'] == 1
+
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning') # the failed stream's reader ends on the error
+def test_reconnect_check_bypasses_the_cache(kaspad):
+    client = RPCClient()
+    client.connect(kaspad.host, kaspad.port, retry_count=1)
+    client.response_cache = ResponseCache(ttls={'getInfoRequest': 60})
+    client.request('getInfoRequest', timeout=5) # cached, but no proof the reconnected stream works
+    kaspad.fail('getInfoRequest', status=grpc.StatusCode.UNAVAILABLE)
+    err = TimeoutError('lost')
+    with pytest.raises(TimeoutError):
+        client._retry_connection(err)
+    assert kaspad.requests['getInfoRequest'] == 2
+    client.close()
@@ -0,0 +1,26 @@
+import time
+
+import pytest
+
+
+def test_unsubscribe_without_stop_request_mutes_notifications(kaspad, client):
+    kaspad.notification_rate = 200
+    received = []
+    client.subscribe('notifyBlockAddedRequest', received.append) # kaspad has no stopNotifyingBlockAddedRequest
+    time.sleep(0.2)
+    client.unsubscribe('notifyBlockAddedRequest')
+    count = len(received)
+    time.sleep(0.2)
+    assert count and len(received) == count
+    with pytest.raises(TimeoutError):
+        client.request_stream.get(timeout=0.1)
+
+
+def test_subscriptions_survive_reconnect(kaspad, client):
+    kaspad.notification_rate = 200
+    received = []
+    client.subscribe('notifyBlockAddedRequest', received.append)
+    client.connect(kaspad.host, kaspad.port)
+    count = len(received)
+    time.sleep(0.2)
+    assert len(received) > count
@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from kaspy.excepts.exceptions import RPCResponseException
+from kaspy.utxo_index import UtxoIndex
+
+ADDRESSES = ['kaspa:mock0', 'kaspa:mock1']
+
+
+def _wait_for(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_bootstraps_and_follows_changes(kaspad, client):
+    kaspad.utxos_per_address, kaspad.notification_rate, kaspad.notification_count = 2, 100, 4
+    index = UtxoIndex(client, ADDRESSES).start()
+    assert index.synced and index.resyncs == 1
+    _wait_for(lambda: len(index) == 2 * 2 + 4)
+    assert sum(index.balances.values()) == 8 * 100000000
+    assert all(utxo.address == 'kaspa:mock0' for utxo in index.utxos('kaspa:mock0'))
+    index.close()
+
+
+def test_start_raises_when_the_snapshot_fails(kaspad, client):
+    kaspad.fail('getUtxosByAddressesRequest', 'method unavailable without --utxoindex')
+    index = UtxoIndex(client, ADDRESSES, timeout=0.5)
+    with pytest.raises(RPCResponseException):
+        index.start()
+    assert not index.synced
+
+
+def test_changes_are_dropped_until_resynced(kaspad, client):
+    kaspad.notification_count = 0
+    index = UtxoIndex(client, ADDRESSES, check_interval=0.1).start()
+    assert len(index) == 2
+    kaspad.fail('getUtxosByAddressesRequest', 'node restarting')
+    kaspad.notification_count = 3
+    client.connect(kaspad.host, kaspad.port) # a new stream, notifications may have been missed
+    _wait_for(lambda: kaspad.notifications['utxosChangedNotification'] == 3)
+    _wait_for(lambda: not index.synced and index._dispatcher.queue_depth == 0)
+    time.sleep(0.1) # the last change is handled
+    assert len(index) == 2 # nothing applied on top of the stale snapshot
+    kaspad.reset()
+    _wait_for(lambda: index.synced)
+    assert len(index) == 2 and index.resyncs == 2
+    index.close()